@@ -0,0 +1,172 @@
+import argparse
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_conversation
+from cl2gi.jsonbackend import JSON_BACKENDS
+
+QUICK_GRID = {
+    "messages": [200, 2000],
+    "segment_chars": [300, 3000],
+    "thinking_ratio": [0.0, 0.5],
+}
+FULL_GRID = {
+    "messages": [100, 1000, 5000, 20000],
+    "segment_chars": [100, 1000, 5000],
+    "thinking_ratio": [0.0, 0.3, 0.8],
+}
+PARSE_MODES = ["json", "stream"]
+
+def peak_rss_mb():
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def measure(input_path, parse_mode, token_mode, json_backend="auto"):
+    """Time parse -> convert -> serialize for one input; runs in a fresh worker process."""
+    from cl2gi import convert_claude_to_gemini, get_encoder, load_conversation, write_gemini
+    from cl2gi.converter import read_json
+
+    if token_mode == "exact":
+        get_encoder()
+    baseline_rss = peak_rss_mb()
+
+    # With streaming ingestion the parse happens inside the convert stage
+    start = time.perf_counter()
+    with open(input_path, "rb") as f:
+        source_data = load_conversation(f) if parse_mode == "stream" else read_json(f, json_backend=json_backend)
+        parse_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        converted, token_stats = convert_claude_to_gemini(source_data, token_mode=token_mode, chunk_store=True)
+        convert_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as output:
+        write_gemini(output, converted, json_backend=json_backend)
+    serialize_seconds = time.perf_counter() - start
+    rss_delta = peak_rss_mb() - baseline_rss
+
+    del converted, source_data
+    tokenization_share = None
+    if token_mode == "exact":
+        # Tokenization share: the part of the convert stage that disappears when counting is off
+        with open(input_path, "rb") as f:
+            source_data = read_json(f)
+        timings = []
+        for mode in ("exact", "off"):
+            start = time.perf_counter()
+            convert_claude_to_gemini(source_data, token_mode=mode, chunk_store=True)
+            timings.append(time.perf_counter() - start)
+        tokenization_share = max(0.0, 1 - timings[1] / timings[0]) if timings[0] else 0.0
+
+    return {
+        "parse_seconds": parse_seconds,
+        "convert_seconds": convert_seconds,
+        "serialize_seconds": serialize_seconds,
+        "total_tokens": token_stats["total_tokens"],
+        "tokenization_share": tokenization_share,
+        "peak_rss_delta_mb": rss_delta,
+    }
+
+def run_case(input_path, parse_mode, token_mode, json_backend):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--worker", input_path, parse_mode, token_mode, json_backend],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+def run_grid(grid, parse_modes, token_mode, seed, json_backends=("auto",), ascii_only=False):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for messages, segment_chars, thinking_ratio in itertools.product(
+                grid["messages"], grid["segment_chars"], grid["thinking_ratio"]):
+            input_path = os.path.join(tmp_dir, "input.json")
+            with open(input_path, "w", encoding="utf-8") as f:
+                json.dump(generate_conversation(messages, segment_chars, thinking_ratio, seed, ascii_only), f)
+            input_mb = os.path.getsize(input_path) / (1024 * 1024)
+
+            for parse_mode, json_backend in itertools.product(parse_modes, json_backends):
+                result = run_case(input_path, parse_mode, token_mode, json_backend)
+                total_seconds = result["parse_seconds"] + result["convert_seconds"] + result["serialize_seconds"]
+                # Cases keep their historical names with the default backend, so saved baselines still match
+                suffix = ("" if json_backend == "auto" else f"-{json_backend}") + ("-ascii" if ascii_only else "")
+                result.update({
+                    "case": f"m{messages}-s{segment_chars}-t{thinking_ratio}-{parse_mode}{suffix}",
+                    "input_mb": input_mb,
+                    "mb_per_second": input_mb / total_seconds,
+                    "messages_per_second": messages / total_seconds,
+                })
+                results.append(result)
+                print(format_row(result), flush=True)
+    return results
+
+def format_row(result):
+    share = result["tokenization_share"]
+    share_text = f"{share:6.0%}" if share is not None else f"{'-':>6}"
+    return (f"{result['case']:<36} {result['input_mb']:8.2f} {result['mb_per_second']:8.2f} "
+            f"{result['messages_per_second']:10.0f} {share_text} {result['peak_rss_delta_mb']:10.1f}")
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {result["case"]: result for result in json.load(f)}
+
+    regressions = []
+    for result in results:
+        before = baseline.get(result["case"])
+        if before is None:
+            continue
+        change = result["mb_per_second"] / before["mb_per_second"] - 1
+        if change < -tolerance:
+            regressions.append(f"{result['case']}: {before['mb_per_second']:.2f} -> "
+                               f"{result['mb_per_second']:.2f} MB/s ({change:+.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark parse -> convert -> serialize on seeded synthetic Claude conversations."
+    )
+    parser.add_argument("--worker", nargs=4, metavar=("INPUT", "PARSE_MODE", "TOKEN_MODE", "JSON_BACKEND"),
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--full", action="store_true", help="Run the full grid instead of the quick one")
+    parser.add_argument("--parse-mode", choices=PARSE_MODES, action="append",
+                        help="Parse modes to benchmark (default: all)")
+    parser.add_argument("--token-mode", default="exact", help="Token mode passed to the converter")
+    parser.add_argument("--json-backend", choices=JSON_BACKENDS, action="append",
+                        help="JSON backends to benchmark, repeatable (default: auto)")
+    parser.add_argument("--ascii", action="store_true",
+                        help="Generate ASCII-only text; the fast JSON backends only encode ASCII texts themselves")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Fail if MB/s regresses against this saved result file")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed MB/s regression for --compare (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(measure(*args.worker)))
+        return 0
+
+    print(f"{'case':<36} {'MB':>8} {'MB/s':>8} {'msgs/s':>10} {'tok %':>6} {'RSS +MB':>10}")
+    results = run_grid(FULL_GRID if args.full else QUICK_GRID, args.parse_mode or PARSE_MODES,
+                       args.token_mode, args.seed, args.json_backend or ["auto"], args.ascii)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import random
+
+WORDS = (
+    "the of and to in is that for it as with was on be by this are from at or an "
+    "model user token convert chunk message export gemini claude conversation file "
+    "return value function request response stream buffer parse result error data "
+    "über naïve café 数据 转换 会话 🙂"
+).split()
+ASCII_WORDS = [word for word in WORDS if word.isascii()]
+
+CODE_LINES = [
+    "def convert(source_data):",
+    "    for msg in source_data.get(\"chat_messages\", []):",
+    "        yield {\"text\": msg[\"text\"], \"role\": role}",
+    "    return converted, token_stats",
+    "if __name__ == \"__main__\":",
+    "    main(sys.argv[1:])",
+]
+
+def _prose(rng, chars, vocabulary=WORDS):
+    words = []
+    size = 0
+    while size < chars:
+        word = rng.choice(vocabulary)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+def _text(rng, chars, vocabulary=WORDS):
+    # Roughly one segment in five carries a fenced code block, as pasted code does in real chats
+    if rng.random() < 0.2:
+        code = "\n".join(rng.choice(CODE_LINES) for _ in range(max(1, chars // 160)))
+        return _prose(rng, chars // 2, vocabulary) + "\n```python\n" + code + "\n```"
+    return _prose(rng, chars, vocabulary)
+
+def generate_conversation(message_count, segment_chars=500, thinking_ratio=0.3, seed=0, ascii_only=False):
+    """Build a Claude-format conversation with alternating human/assistant messages.
+
+    segment_chars is the mean segment length; thinking_ratio is the share of
+    assistant messages that carry a thinking segment. ascii_only leaves out the
+    accented, CJK and emoji words.
+    """
+    rng = random.Random(seed)
+    vocabulary = ASCII_WORDS if ascii_only else WORDS
+    messages = []
+    for index in range(message_count):
+        chars = max(1, int(rng.expovariate(1 / segment_chars)))
+        if index % 2 == 0:
+            content = [{"type": "text", "text": _text(rng, chars, vocabulary)}]
+            sender = "human"
+        else:
+            content = []
+            if rng.random() < thinking_ratio:
+                content.append({"type": "thinking", "thinking": _prose(rng, chars, vocabulary)})
+            content.append({"type": "text", "text": _text(rng, chars, vocabulary)})
+            sender = "assistant"
+        messages.append({
+            "uuid": f"{seed:08x}-{index:08x}",
+            "sender": sender,
+            "created_at": "2025-01-01T00:00:00Z",
+            "content": content
+        })
+
+    return {
+        "uuid": f"bench-{seed}",
+        "name": f"Synthetic conversation {seed}",
+        "model": "claude-3-7-sonnet-20250219",
+        "created_at": "2025-01-01T00:00:00Z",
+        "chat_messages": messages
+    }
@@ -0,0 +1,27 @@
+from cl2gi.converter import (
+    analyze_conversation,
+    convert_analyzed,
+    convert_claude_to_gemini,
+    convert_export,
+    convert_file,
+    output_filename,
+)
+from cl2gi.stream import iter_conversations, iter_gemini_json, load_conversation, write_gemini
+from cl2gi.tokenizer import TOKENIZERS, count_tokens, get_encoder, load_tokenizer
+
+__all__ = [
+    "TOKENIZERS",
+    "analyze_conversation",
+    "convert_analyzed",
+    "convert_claude_to_gemini",
+    "convert_export",
+    "convert_file",
+    "count_tokens",
+    "get_encoder",
+    "iter_conversations",
+    "iter_gemini_json",
+    "load_conversation",
+    "load_tokenizer",
+    "output_filename",
+    "write_gemini",
+]
@@ -0,0 +1,5 @@
+import sys
+
+from cl2gi.cli import main
+
+sys.exit(main())
@@ -0,0 +1,99 @@
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+
+from cl2gi.converter import convert_file, describe_error
+from cl2gi.diagnostics import StageTimer, traced_run
+from cl2gi.incremental import convert_file_incremental
+from cl2gi.tokencache import TokenCountCache
+from cl2gi.tokenizer import DEFAULT_TOKENIZER, load_tokenizer
+
+# Per-process token-count cache, created by _init_worker
+_token_cache = None
+
+def _init_worker(token_mode, token_cache_options, tokenizer=DEFAULT_TOKENIZER):
+    global _token_cache
+    _token_cache = None
+    if token_mode == "exact":
+        load_tokenizer(tokenizer)
+        if token_cache_options is not None:
+            _token_cache = TokenCountCache(**token_cache_options)
+
+def _convert_one(task, convert_options):
+    input_path, output_path = task
+    convert_options = dict(convert_options)
+    convert = convert_file_incremental if convert_options.pop("incremental", False) else convert_file
+    diagnostics_options = convert_options.pop("diagnostics", None)
+    diagnostics = StageTimer(**diagnostics_options) if diagnostics_options is not None else None
+    try:
+        with traced_run(diagnostics):
+            token_stats = convert(input_path, output_path, token_cache=_token_cache, diagnostics=diagnostics,
+                                  **convert_options)
+    except Exception as e:
+        return input_path, output_path, None, describe_error(e)
+    finally:
+        if _token_cache is not None:
+            _token_cache.flush()
+    if diagnostics is not None:
+        token_stats["diagnostics"] = diagnostics.report()
+    return input_path, output_path, token_stats, None
+
+def _convert_chunk(tasks, convert_options):
+    return [_convert_one(task, convert_options) for task in tasks]
+
+def default_chunk_size(task_count, jobs):
+    return max(1, min(32, task_count // (jobs * 4)))
+
+def run_batch(tasks, jobs=1, ordered=True, chunk_size=None, convert_options=None, token_cache_options=None):
+    """Convert (input_path, output_path) tasks, yielding (input, output, token_stats, error).
+
+    Errors are captured per file, so one bad input never stops the batch.
+    convert_options are passed through to convert_file, or to
+    convert_file_incremental when they include incremental=True. With a
+    diagnostics dict of StageTimer options, each file's stage timings are added
+    to its token_stats under "diagnostics". With token_cache_options,
+    each process memoizes exact token counts in a TokenCountCache built from them.
+    """
+    tasks = list(tasks)
+    convert_options = convert_options or {}
+    if jobs is None or jobs <= 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, max(1, len(tasks)))
+
+    initargs = (convert_options.get("token_mode", "exact"), token_cache_options,
+                convert_options.get("tokenizer", DEFAULT_TOKENIZER))
+
+    if jobs == 1:
+        _init_worker(*initargs)
+        for task in tasks:
+            yield _convert_one(task, convert_options)
+        return
+
+    if chunk_size is None:
+        chunk_size = default_chunk_size(len(tasks), jobs)
+    chunks = iter([tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)])
+    max_in_flight = jobs * 2
+    convert_chunk = partial(_convert_chunk, convert_options=convert_options)
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as executor:
+        if ordered:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(convert_chunk, chunk))
+                if len(pending) >= max_in_flight:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        else:
+            pending = set()
+            for chunk in chunks:
+                pending.add(executor.submit(convert_chunk, chunk))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
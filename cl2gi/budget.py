@@ -0,0 +1,184 @@
+import bisect
+
+from cl2gi.chunks import USER, ChunkStore
+
+class TokenPrefixSums:
+    """Cumulative token counts of a counted ChunkStore, built in one pass.
+
+    total[i] is the number of tokens in the chunks before chunk i, and user, model
+    and thinking split it by kind, so the tokens of any chunk range take two lookups.
+    message_bounds are the chunk indices where messages start followed by the chunk
+    count, and message_totals the cumulative tokens at each bound.
+    """
+
+    def __init__(self, chunks):
+        if not isinstance(chunks, ChunkStore):
+            raise TypeError("Token budgets work on a ChunkStore: convert with chunk_store=True")
+        if not chunks.include_token_count:
+            raise ValueError("Token budgets need token counts: use token mode exact or approximate")
+        self.chunks = chunks
+        total, user, model, thinking = [0], [0], [0], [0]
+        running_total = running_user = running_model = running_thinking = 0
+        for count, role, is_thought in zip(chunks.token_counts, chunks.roles, chunks.thoughts):
+            running_total += count
+            if is_thought:
+                running_thinking += count
+            elif role == USER:
+                running_user += count
+            else:
+                running_model += count
+            total.append(running_total)
+            user.append(running_user)
+            model.append(running_model)
+            thinking.append(running_thinking)
+        self.total, self.user, self.model, self.thinking = total, user, model, thinking
+
+        # Without recorded message starts every chunk counts as a message of its own
+        starts = chunks.message_starts if chunks.message_starts is not None else range(len(chunks))
+        self.message_bounds = list(starts) + [len(chunks)]
+        self.message_totals = [total[bound] for bound in self.message_bounds]
+
+    @property
+    def message_count(self):
+        return len(self.message_bounds) - 1
+
+    def range_stats(self, ranges, message_count):
+        # Token statistics of the chunks in each (start, stop) range, in the keys of new_token_stats
+        token_stats = dict.fromkeys(("total_tokens", "user_tokens", "model_tokens", "thinking_tokens"), 0)
+        token_stats["message_count"] = message_count
+        token_stats["has_thinking"] = False
+        for start, stop in ranges:
+            token_stats["total_tokens"] += self.total[stop] - self.total[start]
+            token_stats["user_tokens"] += self.user[stop] - self.user[start]
+            token_stats["model_tokens"] += self.model[stop] - self.model[start]
+            token_stats["thinking_tokens"] += self.thinking[stop] - self.thinking[start]
+            token_stats["has_thinking"] = token_stats["has_thinking"] or 1 in self.chunks.thoughts[start:stop]
+        return token_stats
+
+    def stats(self, first_message, end_message):
+        # Token statistics of messages first_message..end_message
+        bounds = self.message_bounds
+        return self.range_stats([(bounds[first_message], bounds[end_message])], end_message - first_message)
+
+    def split(self, max_tokens, overlap_tokens=0):
+        """Cut the messages into consecutive parts of at most max_tokens tokens.
+
+        Returns (first_message, end_message) per part. Parts are filled greedily, each
+        found with a binary search over message_totals. A message over the budget on its
+        own becomes a part by itself. With overlap_tokens, a part after the first starts
+        with the trailing messages of the previous part that fit in that many tokens.
+        """
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be at least 0 and less than max_tokens")
+        totals = self.message_totals
+        last = self.message_count
+        if last == 0:
+            return [(0, 0)]
+
+        parts = []
+        first = 0
+        while True:
+            end = max(bisect.bisect_right(totals, totals[first] + max_tokens, first) - 1, first + 1)
+            parts.append((first, end))
+            if end == last:
+                return parts
+            if overlap_tokens:
+                # The overlap also has to leave room for the next message, and every part must move forward
+                floor = max(totals[end] - overlap_tokens, totals[end + 1] - max_tokens)
+                first = bisect.bisect_left(totals, floor, first + 1, end)
+            else:
+                first = end
+
+    def newest(self, max_tokens, keep_first_user=False):
+        """Pick the newest chunks that fit in max_tokens, returning (start, stop) chunk ranges.
+
+        Takes one binary search over the cumulative totals. With keep_first_user,
+        the chunks of the first message with user text come first and count against
+        the budget; they are kept even when they alone exceed it.
+        """
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        end = len(self.total) - 1
+        if self.total[end] <= max_tokens:
+            return [(0, end)]
+
+        head = None
+        first_user = self.chunks.roles.find(USER) if keep_first_user else -1
+        if first_user != -1:
+            message = bisect.bisect_right(self.message_bounds, first_user) - 1
+            head = (self.message_bounds[message], self.message_bounds[message + 1])
+            max_tokens = max(max_tokens - (self.total[head[1]] - self.total[head[0]]), 0)
+        lowest = head[1] if head is not None else 0
+        start = bisect.bisect_left(self.total, self.total[end] - max_tokens, lowest, end)
+        if head is None:
+            return [(start, end)]
+        if start == head[1]:
+            return [(head[0], end)]
+        return [head, (start, end)] if start < end else [head]
+
+def truncate_conversation(converted, max_tokens, keep_first_user=False, prefix_sums=None):
+    """Keep the newest chunks of a converted conversation that fit in max_tokens tokens.
+
+    See TokenPrefixSums.newest. Returns (converted, token_stats) for the kept chunks;
+    token_stats also hold the dropped_chunks and dropped_tokens. Pass prefix_sums to
+    make several budgeted variants of one conversion at a binary search each.
+    """
+    chunks = converted["chunkedPrompt"]["chunks"]
+    if prefix_sums is None:
+        prefix_sums = TokenPrefixSums(chunks)
+    ranges = prefix_sums.newest(max_tokens, keep_first_user)
+
+    # A message cut in the middle is kept from its first kept chunk on
+    bounds = prefix_sums.message_bounds
+    message_starts = []
+    kept_chunks = 0
+    for start, stop in ranges:
+        first_message = bisect.bisect_right(bounds, start) - 1 if start else 0
+        if stop < len(chunks):
+            end_message = bisect.bisect_left(bounds, stop, first_message)
+        else:
+            end_message = prefix_sums.message_count
+        message_starts.extend(kept_chunks + max(bounds[message] - start, 0)
+                              for message in range(first_message, end_message))
+        kept_chunks += stop - start
+    token_stats = prefix_sums.range_stats(ranges, len(message_starts))
+    token_stats["dropped_chunks"] = len(chunks) - kept_chunks
+    token_stats["dropped_tokens"] = prefix_sums.total[-1] - token_stats["total_tokens"]
+
+    if kept_chunks == len(chunks):
+        return converted, token_stats
+    kept = chunks.select(ranges)
+    kept.message_starts = message_starts
+    truncated = dict(converted)
+    truncated["chunkedPrompt"] = dict(converted["chunkedPrompt"], chunks=kept)
+    return truncated, token_stats
+
+def split_conversation(converted, max_tokens, overlap_tokens=0, prefix_sums=None):
+    """Split a converted conversation into documents of at most max_tokens tokens each.
+
+    Cuts fall between messages, using the tokenCount of each chunk; see
+    TokenPrefixSums.split. Returns (converted, token_stats) per part. Each part's
+    token_stats also record its first_message and the overlap_messages it repeats
+    from the previous part. prefix_sums can be passed to reuse them across calls.
+    """
+    chunks = converted["chunkedPrompt"]["chunks"]
+    if prefix_sums is None:
+        prefix_sums = TokenPrefixSums(chunks)
+    bounds = prefix_sums.message_bounds
+
+    parts = []
+    previous_end = 0
+    for first, end in prefix_sums.split(max_tokens, overlap_tokens):
+        start = bounds[first]
+        part_chunks = chunks.slice(start, bounds[end])
+        part_chunks.message_starts = [bound - start for bound in bounds[first:end]]
+        part = dict(converted)
+        part["chunkedPrompt"] = dict(converted["chunkedPrompt"], chunks=part_chunks)
+        token_stats = prefix_sums.stats(first, end)
+        token_stats["first_message"] = first
+        token_stats["overlap_messages"] = previous_end - first if parts else 0
+        parts.append((part, token_stats))
+        previous_end = end
+    return parts
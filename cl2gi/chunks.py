@@ -0,0 +1,134 @@
+from array import array
+from json.encoder import encode_basestring_ascii
+
+USER = 0
+MODEL = 1
+ROLE_NAMES = ("user", "model")
+
+def make_chunk(text, role, is_thought, token_count=None):
+    # Key order matches the Gemini output format
+    chunk = {"text": text, "role": ROLE_NAMES[role]}
+    if is_thought:
+        chunk["isThought"] = True
+    if token_count is not None:
+        chunk["tokenCount"] = token_count
+    if role == MODEL and not is_thought:
+        chunk["finishReason"] = "STOP"
+    return chunk
+
+class ChunkStore:
+    """Gemini chunks held as parallel arrays instead of one dict per chunk.
+
+    Texts live in a list; roles and thought flags are bytes and token counts
+    64-bit ints, so a chunk costs a few bytes beyond its text. Indexing and
+    iteration build the chunk dicts on demand, and dumps/iter_json serialize
+    straight from the arrays without building them at all. message_starts holds
+    the index of the first chunk of each source message, when known.
+    """
+
+    __slots__ = ("include_token_count", "texts", "roles", "thoughts", "token_counts", "message_starts")
+
+    def __init__(self, include_token_count=True, texts=None, roles=None, thoughts=None, message_starts=None):
+        self.include_token_count = include_token_count
+        self.texts = [] if texts is None else texts
+        self.roles = bytearray() if roles is None else roles
+        self.thoughts = bytearray() if thoughts is None else thoughts
+        self.token_counts = array("q", bytes(8 * len(self.texts)))
+        self.message_starts = message_starts
+
+    def append(self, text, role, is_thought):
+        self.texts.append(text)
+        self.roles.append(role)
+        self.thoughts.append(is_thought)
+        self.token_counts.append(0)
+
+    def copy(self, include_token_count=True):
+        # Texts, roles and flags are never changed once built, so copies share them
+        return ChunkStore(include_token_count, self.texts, self.roles, self.thoughts, self.message_starts)
+
+    def slice(self, start, stop):
+        # A counted copy of chunks start..stop, for splitting a conversation into parts
+        return self.select([(start, stop)])
+
+    def select(self, ranges):
+        # A counted copy of the chunks in each (start, stop) range, in order
+        part = ChunkStore(self.include_token_count)
+        for start, stop in ranges:
+            part.texts.extend(self.texts[start:stop])
+            part.roles.extend(self.roles[start:stop])
+            part.thoughts.extend(self.thoughts[start:stop])
+            part.token_counts.extend(self.token_counts[start:stop])
+        return part
+
+    def has_thought(self):
+        return 1 in self.thoughts
+
+    def tally(self, index, token_stats):
+        count = self.token_counts[index]
+        token_stats["total_tokens"] += count
+        if self.thoughts[index]:
+            token_stats["thinking_tokens"] += count
+        elif self.roles[index] == USER:
+            token_stats["user_tokens"] += count
+        else:
+            token_stats["model_tokens"] += count
+
+    def record_token_counts(self, start, token_counts, token_stats):
+        for index, count in enumerate(token_counts, start):
+            self.token_counts[index] = count
+            self.tally(index, token_stats)
+
+    def chunk(self, index):
+        token_count = self.token_counts[index] if self.include_token_count else None
+        return make_chunk(self.texts[index], self.roles[index], self.thoughts[index], token_count)
+
+    def dumps(self, index, indent=2, item_prefix="", dumps_string=encode_basestring_ascii):
+        """Serialize one chunk exactly as cl2gi.stream.dumps_chunk would serialize its dict.
+
+        dumps_string(text) must return json.dumps(text), as JsonBackend.dumps_string does.
+        """
+        role = self.roles[index]
+        is_thought = self.thoughts[index]
+        colon = ":" if indent is None else ": "
+        fields = ['"text"' + colon + dumps_string(self.texts[index]),
+                  '"role"' + colon + ('"model"' if role else '"user"')]
+        if is_thought:
+            fields.append('"isThought"' + colon + "true")
+        if self.include_token_count:
+            fields.append('"tokenCount"' + colon + str(self.token_counts[index]))
+        if role == MODEL and not is_thought:
+            fields.append('"finishReason"' + colon + '"STOP"')
+
+        if indent is None:
+            return item_prefix + "{" + ",".join(fields) + "}"
+        newline = item_prefix or "\n"
+        field_indent = newline + (" " * indent if isinstance(indent, int) else indent)
+        return item_prefix + "{" + field_indent + ("," + field_indent).join(fields) + newline + "}"
+
+    def iter_json(self, indent=2, item_prefix="", dumps_string=encode_basestring_ascii):
+        for index in range(len(self.texts)):
+            yield self.dumps(index, indent, item_prefix, dumps_string)
+
+    def to_list(self):
+        return [self.chunk(index) for index in range(len(self.texts))]
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.chunk(i) for i in range(*index.indices(len(self.texts)))]
+        if index < 0:
+            index += len(self.texts)
+        if not 0 <= index < len(self.texts):
+            raise IndexError("chunk index out of range")
+        return self.chunk(index)
+
+    def __iter__(self):
+        for index in range(len(self.texts)):
+            yield self.chunk(index)
+
+    def __eq__(self, other):
+        if isinstance(other, (ChunkStore, list)):
+            return list(self) == list(other)
+        return NotImplemented
@@ -0,0 +1,289 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+from cl2gi.batch import run_batch
+from cl2gi.converter import export_output_path, output_filename, part_output_path, part_output_pattern
+from cl2gi.jsonbackend import JSON_BACKENDS, available_backends
+from cl2gi.tokencache import DEFAULT_MAX_ENTRIES
+from cl2gi.tokenizer import DEFAULT_TOKENIZE_THREADS, DEFAULT_TOKENIZER, TOKEN_MODES, TOKENIZERS, load_tokenizer
+
+# Files written by the converter, skipped when searching directories for inputs
+OUTPUT_NAME = re.compile(r"_gemini(\.manifest|\.part\d+)?\.json$")
+
+def expand_inputs(patterns):
+    inputs = []
+    unmatched = []
+    seen = set()
+
+    def add(path, relative_name):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            inputs.append((path, relative_name))
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(".json") and not OUTPUT_NAME.search(name):
+                        path = os.path.join(root, name)
+                        add(path, os.path.relpath(path, pattern))
+        elif os.path.isfile(pattern):
+            add(pattern, os.path.basename(pattern))
+        else:
+            matches = sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+            if not matches:
+                unmatched.append(pattern)
+            for path in matches:
+                add(path, os.path.basename(path))
+
+    return inputs, unmatched
+
+def output_path_for(input_path, relative_name, output_dir=None):
+    if output_dir is None:
+        return os.path.join(os.path.dirname(input_path), output_filename(os.path.basename(input_path)))
+    relative_dir = os.path.dirname(relative_name)
+    return os.path.join(output_dir, relative_dir, output_filename(os.path.basename(relative_name)))
+
+def format_token_total(token_stats):
+    token_mode = token_stats.get("token_mode", "exact")
+    if token_mode == "off":
+        return ""
+    prefix = "~" if token_mode == "approximate" else ""
+    return f", {prefix}{token_stats['total_tokens']:,} tokens"
+
+class ProgressBar:
+    """One-line terminal progress for serial runs, fed by the converter's message events."""
+
+    WIDTH = 30
+    REDRAW_SECONDS = 0.1
+
+    def __init__(self, input_paths, stream=sys.stderr):
+        self.input_paths = input_paths
+        self.stream = stream
+        self.file_index = 0
+        self.last_draw = 0.0
+        self.line_length = 0
+
+    def __call__(self, event):
+        if event["type"] != "message":
+            return
+        now = time.monotonic()
+        done, total = event["messages_done"], event["messages_total"]
+        if now - self.last_draw < self.REDRAW_SECONDS and done < total:
+            return
+        self.last_draw = now
+
+        filled = self.WIDTH * done // total if total else self.WIDTH
+        label = os.path.basename(self.input_paths[self.file_index]) if self.file_index < len(self.input_paths) else ""
+        line = (f"{label} [{'#' * filled}{'-' * (self.WIDTH - filled)}] {done:,}/{total:,} messages, "
+                f"{event['tokens']:,} tokens, {event['elapsed']:.1f}s")
+        self.stream.write("\r" + line.ljust(self.line_length))
+        self.stream.flush()
+        self.line_length = len(line)
+
+    def next_file(self):
+        # Clears the line before a result is printed; results arrive in input order when serial
+        if self.line_length:
+            self.stream.write("\r" + " " * self.line_length + "\r")
+            self.stream.flush()
+            self.line_length = 0
+        self.file_index += 1
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="cl2gi",
+        description="Convert Claude chat JSON files to Gemini's chunkedPrompt format."
+    )
+    parser.add_argument("inputs", nargs="+",
+                        help="Claude JSON files, directories (searched recursively) or glob patterns")
+    parser.add_argument("-o", "--output-dir",
+                        help="Write outputs under this directory instead of next to each input")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="Skip inputs whose output (_gemini.json, or an export's _gemini directory or ZIP) "
+                             "already exists")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes (0 uses every core, default: 1)")
+    parser.add_argument("--chunk-size", type=int,
+                        help="Inputs handed to a worker per task (default: sized from the batch)")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Report results as they finish instead of in input order")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Parse inputs incrementally, one message at a time, to bound memory on huge files")
+    parser.add_argument("--zip", action="store_true", dest="zip_exports",
+                        help="Pack the conversations of an account export into one ZIP instead of a directory")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep a manifest next to each output and on re-runs only convert new or changed messages")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write compact JSON without indentation (default: 2-space indent)")
+    parser.add_argument("--json-backend", choices=JSON_BACKENDS, default="auto",
+                        help="Library used to parse inputs and encode texts; output is identical with each "
+                             "(default: auto, the first installed of msgspec, orjson and json)")
+    parser.add_argument("--token-mode", choices=TOKEN_MODES, default="exact",
+                        help="exact: tiktoken counts (default); approximate: fast byte-ratio estimate; "
+                             "off: omit tokenCount")
+    parser.add_argument("--tokenizer", choices=TOKENIZERS, default=DEFAULT_TOKENIZER,
+                        help=f"Tokenizer behind exact counts: a tiktoken encoding, or gemini-estimate for "
+                             f"Gemini's documented ~4 characters per token (default: {DEFAULT_TOKENIZER})")
+    parser.add_argument("--max-tokens", type=int, metavar="TOKENS",
+                        help="Keep only the newest chunks of each conversation that fit in TOKENS tokens")
+    parser.add_argument("--keep-first-user", action="store_true",
+                        help="With --max-tokens, always keep the first user message; it counts against the budget")
+    parser.add_argument("--split-tokens", type=int, metavar="TOKENS",
+                        help="Split each conversation at message boundaries into parts of at most TOKENS tokens, "
+                             "written as <name>_gemini.partNNN.json")
+    parser.add_argument("--split-overlap", type=int, default=0, metavar="TOKENS",
+                        help="Start each part after the first with the previous part's last messages "
+                             "that fit in TOKENS tokens (default: 0)")
+    parser.add_argument("--token-cache", metavar="PATH",
+                        help="Persist exact token counts in this SQLite file so repeat runs skip tokenization")
+    parser.add_argument("--token-cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help=f"In-memory token-count cache entries per process, 0 to disable "
+                             f"(default: {DEFAULT_MAX_ENTRIES:,})")
+    parser.add_argument("--batch-tokenize", action="store_true",
+                        help="Collect every segment first and count tokens in batched tiktoken calls")
+    parser.add_argument("--parallel-tokenize", action="store_true",
+                        help="Count the segments of each conversation concurrently on a shared thread pool, "
+                             "so one huge conversation uses several cores; takes precedence over --batch-tokenize")
+    parser.add_argument("--tokenize-threads", type=int, default=DEFAULT_TOKENIZE_THREADS,
+                        help=f"Threads used by --batch-tokenize and --parallel-tokenize "
+                             f"(default: {DEFAULT_TOKENIZE_THREADS})")
+    parser.add_argument("--progress", action=argparse.BooleanOptionalAction,
+                        help="Show a per-message progress bar while converting with one job "
+                             "(default: on when stderr is a terminal)")
+    parser.add_argument("--diagnostics", metavar="PATH",
+                        help="Write per-file stage timings (wall time, CPU time, tracemalloc peak) as JSON "
+                             "to PATH, or to stdout with '-'")
+    parser.add_argument("--no-trace-memory", action="store_false", dest="trace_memory",
+                        help="Skip tracemalloc peaks in --diagnostics; tracing slows tokenization several times")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only report errors")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.json_backend != "auto" and args.json_backend not in available_backends():
+        parser.error(f"JSON backend {args.json_backend!r} is not installed")
+    if args.max_tokens is not None:
+        if args.max_tokens <= 0:
+            parser.error("--max-tokens must be positive")
+        if args.token_mode == "off":
+            parser.error("--max-tokens needs token counts; use --token-mode exact or approximate")
+        if args.incremental:
+            parser.error("--max-tokens cannot be combined with --incremental")
+    elif args.keep_first_user:
+        parser.error("--keep-first-user requires --max-tokens")
+    if args.split_tokens is not None:
+        if args.split_tokens <= 0:
+            parser.error("--split-tokens must be positive")
+        if not 0 <= args.split_overlap < args.split_tokens:
+            parser.error("--split-overlap must be at least 0 and less than --split-tokens")
+        if args.token_mode == "off":
+            parser.error("--split-tokens needs token counts; use --token-mode exact or approximate")
+        if args.incremental:
+            parser.error("--split-tokens cannot be combined with --incremental")
+    inputs, unmatched = expand_inputs(args.inputs)
+
+    failures = 0
+    for pattern in unmatched:
+        print(f"error: no files match {pattern!r}", file=sys.stderr)
+        failures += 1
+
+    tasks = []
+    for input_path, relative_name in inputs:
+        output_path = output_path_for(input_path, relative_name, args.output_dir)
+        # The input is not read yet, so an account export's directory or ZIP counts as existing output too
+        existing_paths = (part_output_path(output_path, 1) if args.split_tokens is not None else output_path,
+                          export_output_path(output_path, args.zip_exports))
+        if args.skip_existing and any(os.path.exists(path) for path in existing_paths):
+            continue
+        tasks.append((input_path, output_path))
+
+    convert_options = {
+        "batch_tokenize": args.batch_tokenize,
+        "parallel_tokenize": args.parallel_tokenize,
+        "num_threads": args.tokenize_threads,
+        "token_mode": args.token_mode,
+        "tokenizer": args.tokenizer,
+        "streaming": args.streaming,
+        "indent": None if args.compact else 2,
+        "json_backend": args.json_backend,
+        "zip_exports": args.zip_exports,
+        "incremental": args.incremental,
+        "diagnostics": {"trace_memory": args.trace_memory} if args.diagnostics else None,
+    }
+    if args.max_tokens is not None:
+        convert_options.update(max_tokens=args.max_tokens, keep_first_user=args.keep_first_user)
+    if args.split_tokens is not None:
+        convert_options.update(split_tokens=args.split_tokens, split_overlap=args.split_overlap)
+    show_progress = args.progress if args.progress is not None else sys.stderr.isatty() and not args.quiet
+    progress_bar = None
+    if show_progress and args.jobs == 1:
+        # Callbacks cannot cross process boundaries, so only the in-process serial path reports progress
+        progress_bar = ProgressBar([input_path for input_path, _ in tasks])
+        convert_options["progress"] = progress_bar
+    if args.token_mode == "exact" and tasks:
+        # Fail once with the reason instead of once per worker
+        try:
+            load_tokenizer(args.tokenizer)
+        except RuntimeError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+    token_cache_options = None
+    if args.token_cache_size > 0 or args.token_cache:
+        token_cache_options = {"max_entries": max(args.token_cache_size, 0), "path": args.token_cache}
+    results = run_batch(tasks, jobs=args.jobs, ordered=not args.unordered, chunk_size=args.chunk_size,
+                        convert_options=convert_options, token_cache_options=token_cache_options)
+    diagnostics = []
+    for input_path, output_path, token_stats, error in results:
+        if progress_bar is not None:
+            progress_bar.next_file()
+        if error is not None:
+            print(f"error: {input_path}: {error}", file=sys.stderr)
+            failures += 1
+            continue
+        if "conversation_count" in token_stats:
+            for entry_name, entry_error in token_stats["failed"]:
+                print(f"error: {input_path}: {entry_name}: {entry_error}", file=sys.stderr)
+                failures += 1
+            output_path = export_output_path(output_path, args.zip_exports)
+            summary = f"{token_stats['conversation_count']} conversations, "
+            if token_stats["failed"]:
+                summary += f"{len(token_stats['failed'])} failed, "
+        else:
+            summary = ""
+        if "part_count" in token_stats:
+            summary += f"{token_stats['part_count']} parts, "
+            if "conversation_count" not in token_stats:
+                # A split conversation is only written as parts
+                output_path = part_output_pattern(output_path)
+        if "reused_messages" in token_stats:
+            reused = f", {token_stats['reused_messages']} reused"
+        else:
+            reused = ""
+        if token_stats.get("dropped_chunks"):
+            reused += f", {token_stats['dropped_chunks']:,} chunks dropped"
+        if "diagnostics" in token_stats:
+            diagnostics.append({"input": input_path, "output": output_path, "stages": token_stats["diagnostics"]})
+        if not args.quiet:
+            print(f"{input_path} -> {output_path} "
+                  f"({summary}{token_stats['message_count']} messages{reused}{format_token_total(token_stats)})")
+            for part in token_stats.get("parts", []):
+                overlap = f", {part['overlap_messages']} overlapping" if part["overlap_messages"] else ""
+                print(f"  {part['output']} ({part['message_count']} messages{overlap}{format_token_total(part)})")
+
+    if args.diagnostics == "-":
+        json.dump(diagnostics, sys.stdout, indent=2)
+        print()
+    elif args.diagnostics:
+        with open(args.diagnostics, "w", encoding="utf-8") as f:
+            json.dump(diagnostics, f, indent=2)
+
+    return 1 if failures else 0
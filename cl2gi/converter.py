@@ -0,0 +1,493 @@
+import bisect
+import json
+import os
+import re
+import time
+import zipfile
+
+from cl2gi.budget import split_conversation, truncate_conversation
+from cl2gi.chunks import MODEL, USER, ChunkStore
+from cl2gi.diagnostics import timed, timed_iter
+from cl2gi.jsonbackend import get_json_backend
+from cl2gi.stream import iter_conversations, load_conversation, sniff_top_level, write_gemini
+from cl2gi.tokenizer import (
+    DEFAULT_TOKENIZE_THREADS,
+    DEFAULT_TOKENIZER,
+    GEMINI_ESTIMATE,
+    PARALLEL_SLICES_PER_THREAD,
+    TOKENIZE_BATCH_SIZE,
+    TOKEN_MODES,
+    count_tokens,
+    count_tokens_batch,
+    count_tokens_parallel,
+    check_tokenizer,
+    estimate_gemini_tokens,
+    estimate_tokens,
+)
+
+METADATA_KEYS = ["uuid", "name", "model", "created_at"]
+
+PREVIEW_CHARS = 500
+# Chunks counted between progress callbacks on the per-segment and approximate paths
+PROGRESS_EVERY = 64
+# Upper bounds, in characters, of the size histogram buckets; the last bucket is open-ended
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536)
+SIZE_BUCKET_LABELS = ("<=256", "<=1K", "<=4K", "<=16K", "<=64K", ">64K")
+
+def new_summary():
+    return {
+        "message_count": 0,
+        "messages_by_sender": {},
+        "segments_by_type": {},
+        "chunk_count": 0,
+        "has_thinking": False,
+        "text_chars": 0,
+        "message_sizes": dict.fromkeys(SIZE_BUCKET_LABELS, 0),
+        "segment_sizes": dict.fromkeys(SIZE_BUCKET_LABELS, 0),
+        "first_message_preview": None
+    }
+
+def size_bucket(size):
+    return SIZE_BUCKET_LABELS[bisect.bisect_left(SIZE_BUCKETS, size)]
+
+def preview_message(msg):
+    text = json.dumps(msg, indent=2)
+    return text[:PREVIEW_CHARS] + "..." if len(text) > PREVIEW_CHARS else text
+
+def summarize_message(summary, msg):
+    if summary["message_count"] == 0:
+        summary["first_message_preview"] = preview_message(msg)
+    summary["message_count"] += 1
+    senders = summary["messages_by_sender"]
+    senders[msg["sender"]] = senders.get(msg["sender"], 0) + 1
+
+    segment_types = summary["segments_by_type"]
+    segment_sizes = summary["segment_sizes"]
+    message_chars = 0
+    for segment in msg.get("content", []):
+        segment_type = segment.get("type")
+        segment_types[segment_type] = segment_types.get(segment_type, 0) + 1
+        if segment_type == "thinking":
+            summary["has_thinking"] = True
+        if segment_type in ("text", "thinking"):
+            size = len(segment.get(segment_type, ""))
+            message_chars += size
+            segment_sizes[size_bucket(size)] += 1
+
+    summary["text_chars"] += message_chars
+    summary["message_sizes"][size_bucket(message_chars)] += 1
+
+def analyze_conversation(source_data, include_token_count=True):
+    """Walk chat_messages once, building the conversion chunks and a summary of the conversation.
+
+    The summary holds message and segment counts, thinking presence, size histograms,
+    a preview of the first message and the metadata. Since it is a single pass it also
+    works on a streamed source and picks up metadata stored after the messages.
+    Returns (summary, chunks); chunks is a ChunkStore whose token counts are still zero.
+    """
+    summary = new_summary()
+    chunks, message_starts = collect_chunks(source_data, include_token_count, summary)
+    summary["chunk_count"] = len(chunks)
+    summary["message_chunk_starts"] = message_starts
+    summary["has_chat_messages"] = "chat_messages" in source_data
+    summary["metadata"] = {key: source_data[key] for key in METADATA_KEYS if key in source_data}
+    return summary, chunks
+
+def collect_chunks(source_data, include_token_count=True, summary=None):
+    # Returns a ChunkStore and the index of the first chunk of each message, for progress in messages
+    walk_stats = new_token_stats()
+    chunks = ChunkStore(include_token_count)
+    message_starts = []
+    for text, role, is_thought in iter_segments(source_data, walk_stats, summary):
+        while len(message_starts) < walk_stats["message_count"]:
+            message_starts.append(len(chunks))
+        chunks.append(text, role, is_thought)
+    message_starts.extend([len(chunks)] * (walk_stats["message_count"] - len(message_starts)))
+    chunks.message_starts = message_starts
+    return chunks, message_starts
+
+class ProgressReporter:
+    """Turns token counting progress into progress(event) calls.
+
+    Every counted chunk produces a "segment" event, and every message whose chunks
+    are all counted a "message" event. An event is a dict with its type, the
+    segments and messages done out of their totals, the cumulative token count
+    and the seconds elapsed since the conversion started.
+    """
+
+    def __init__(self, callback, message_starts, chunks, started=None):
+        self.callback = callback
+        self.message_starts = message_starts
+        self.chunks = chunks
+        self.started = time.perf_counter() if started is None else started
+        self.segments_done = 0
+        self.messages_done = 0
+        self.tokens = 0
+
+    def _emit(self, event_type):
+        self.callback({
+            "type": event_type,
+            "segments_done": self.segments_done,
+            "segments_total": len(self.chunks),
+            "messages_done": self.messages_done,
+            "messages_total": len(self.message_starts),
+            "tokens": self.tokens,
+            "elapsed": time.perf_counter() - self.started,
+        })
+
+    def _finish_messages(self):
+        messages_total = len(self.message_starts)
+        while self.messages_done < messages_total:
+            next_index = self.messages_done + 1
+            if next_index < messages_total:
+                finished = self.message_starts[next_index] <= self.segments_done
+            else:
+                finished = self.segments_done == len(self.chunks)
+            if not finished:
+                return
+            self.messages_done = next_index
+            self._emit("message")
+
+    def __call__(self, chunks_done, token_stats=None):
+        self._finish_messages()
+        while self.segments_done < chunks_done:
+            self.tokens += self.chunks.token_counts[self.segments_done]
+            self.segments_done += 1
+            self._emit("segment")
+            self._finish_messages()
+
+def output_filename(input_name):
+    output_name = input_name.replace(".json", "_gemini.json")
+    if not output_name.endswith("_gemini.json"):
+        output_name += "_gemini.json"
+    return output_name
+
+def new_gemini_document():
+    return {
+        "runSettings": {
+            "temperature": 1.0,
+            "model": "models/gemini-2.5-pro-preview-03-25",
+            "topP": 0.95,
+            "topK": 64,
+            "maxOutputTokens": 65536,
+            "safetySettings": [
+                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "OFF"},
+                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "OFF"},
+                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "OFF"},
+                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "OFF"}
+            ],
+            "responseMimeType": "text/plain",
+            "enableCodeExecution": False,
+            "enableEnhancedCivicAnswers": True,
+            "enableSearchAsATool": False,
+            "enableBrowseAsATool": False,
+            "enableAutoFunctionResponse": False
+        },
+        "systemInstruction": {},
+        "chunkedPrompt": {
+            "chunks": [],
+            "pendingInputs": [{
+                "text": "",
+                "role": "user"
+            }]
+        }
+    }
+
+def convert_claude_to_gemini(source_data, *, batch_tokenize=False, num_threads=DEFAULT_TOKENIZE_THREADS,
+                             token_mode="exact", token_cache=None, progress=None, diagnostics=None,
+                             parallel_tokenize=False, tokenizer=DEFAULT_TOKENIZER, max_tokens=None,
+                             keep_first_user=False, chunk_store=False):
+    """Convert a Claude conversation, returning (converted, token_stats).
+
+    With progress, progress(event) receives per-segment and per-message events
+    while tokens are counted; see ProgressReporter. With a StageTimer as
+    diagnostics, the "chunks" and "tokenize" stages are recorded in it.
+    parallel_tokenize counts exact tokens on a shared pool of num_threads threads.
+    tokenizer names the exact counter, one of TOKENIZERS; it is loaded on first use.
+    With max_tokens, only the newest chunks that fit are kept, and with keep_first_user
+    the first user message too; see cl2gi.budget.truncate_conversation.
+    The options are keyword-only.
+    chunkedPrompt.chunks is a list of chunk dicts, ready for json.dumps; with chunk_store
+    it is the ChunkStore the pipeline works on, which write_gemini serializes faster.
+    """
+    started = time.perf_counter()
+    if not isinstance(source_data, dict) or "chat_messages" not in source_data:
+        raise ValueError("Invalid input: Expected a JSON object with 'chat_messages' field")
+    if token_mode not in TOKEN_MODES:
+        raise ValueError(f"Invalid token mode {token_mode!r}: expected one of {', '.join(TOKEN_MODES)}")
+    check_tokenizer(tokenizer)
+    check_max_tokens(max_tokens, token_mode)
+    
+    # Without a caller that wants the summary, the per-message bookkeeping is skipped
+    with timed(diagnostics, "chunks"):
+        chunks, message_starts = collect_chunks(source_data, include_token_count=token_mode != "off")
+    reporter = ProgressReporter(progress, message_starts, chunks, started) if progress is not None else None
+    return _finish_conversion(len(message_starts), chunks, batch_tokenize=batch_tokenize, num_threads=num_threads,
+                              token_mode=token_mode, token_cache=token_cache, on_counted=reporter,
+                              diagnostics=diagnostics, parallel_tokenize=parallel_tokenize, tokenizer=tokenizer,
+                              max_tokens=max_tokens, keep_first_user=keep_first_user, chunk_store=chunk_store)
+
+def convert_analyzed(summary, chunks, *, batch_tokenize=False, num_threads=DEFAULT_TOKENIZE_THREADS,
+                     token_mode="exact", token_cache=None, progress=None, diagnostics=None,
+                     parallel_tokenize=False, tokenizer=DEFAULT_TOKENIZER, max_tokens=None, keep_first_user=False,
+                     chunk_store=False):
+    """Convert from the output of analyze_conversation without walking the messages again.
+
+    The chunks are copied, so one analysis can be converted with several token modes.
+    The other options work as in convert_claude_to_gemini.
+    """
+    started = time.perf_counter()
+    if not summary["has_chat_messages"]:
+        raise ValueError("Invalid input: Expected a JSON object with 'chat_messages' field")
+    if token_mode not in TOKEN_MODES:
+        raise ValueError(f"Invalid token mode {token_mode!r}: expected one of {', '.join(TOKEN_MODES)}")
+    check_tokenizer(tokenizer)
+    check_max_tokens(max_tokens, token_mode)
+
+    chunks = chunks.copy(include_token_count=token_mode != "off")
+    reporter = None
+    if progress is not None:
+        reporter = ProgressReporter(progress, summary["message_chunk_starts"], chunks, started)
+    return _finish_conversion(summary["message_count"], chunks, batch_tokenize=batch_tokenize,
+                              num_threads=num_threads, token_mode=token_mode, token_cache=token_cache,
+                              on_counted=reporter, diagnostics=diagnostics, parallel_tokenize=parallel_tokenize,
+                              tokenizer=tokenizer, max_tokens=max_tokens, keep_first_user=keep_first_user,
+                              chunk_store=chunk_store)
+
+def check_max_tokens(max_tokens, token_mode):
+    if max_tokens is None:
+        return
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    if token_mode == "off":
+        raise ValueError("max_tokens needs token counts: use token mode exact or approximate")
+
+def _finish_conversion(message_count, chunks, *, batch_tokenize, num_threads, token_mode, token_cache,
+                       on_counted=None, diagnostics=None, parallel_tokenize=False, tokenizer=DEFAULT_TOKENIZER,
+                       max_tokens=None, keep_first_user=False, chunk_store=False):
+    converted = new_gemini_document()
+    converted["chunkedPrompt"]["chunks"] = chunks
+    token_stats = new_token_stats()
+    token_stats["token_mode"] = token_mode
+    token_stats["message_count"] = message_count
+    token_stats["has_thinking"] = chunks.has_thought()
+    with timed(diagnostics, "tokenize"):
+        count_chunk_tokens(chunks, token_stats, token_mode, batch_tokenize=batch_tokenize, num_threads=num_threads,
+                           token_cache=token_cache, on_counted=on_counted, parallel_tokenize=parallel_tokenize,
+                           tokenizer=tokenizer)
+
+    if max_tokens is not None:
+        converted, kept_stats = truncate_conversation(converted, max_tokens, keep_first_user)
+        token_stats.update(kept_stats)
+    if not chunk_store:
+        converted["chunkedPrompt"]["chunks"] = converted["chunkedPrompt"]["chunks"].to_list()
+    return converted, token_stats
+
+def count_chunk_tokens(chunks, token_stats, token_mode="exact", batch_tokenize=False,
+                       num_threads=DEFAULT_TOKENIZE_THREADS, token_cache=None, on_counted=None,
+                       parallel_tokenize=False, tokenizer=DEFAULT_TOKENIZER):
+    # Fills in the token counts of a ChunkStore and adds them to token_stats.
+    # With on_counted, chunks are counted in slices and on_counted(chunks_done, token_stats) follows each one.
+    if token_mode == "off":
+        if on_counted is not None:
+            on_counted(len(chunks), token_stats)
+        return
+    step = PROGRESS_EVERY
+    if token_mode == "approximate":
+        count_texts = lambda texts: [estimate_tokens(text) for text in texts]
+    elif tokenizer == GEMINI_ESTIMATE:
+        # Cheaper to compute than to look up, so neither cached nor spread over threads
+        count_texts = lambda texts: [estimate_gemini_tokens(text) for text in texts]
+    elif parallel_tokenize:
+        if token_cache is not None:
+            count_texts = lambda texts: token_cache.count_many(texts, num_threads=num_threads, tokenizer=tokenizer,
+                                                               batch_counter=count_tokens_parallel)
+        else:
+            count_texts = lambda texts: count_tokens_parallel(texts, num_threads=num_threads, tokenizer=tokenizer)
+        # Each progress step still gives every thread a few slices to count
+        step = PROGRESS_EVERY * num_threads * PARALLEL_SLICES_PER_THREAD
+    elif batch_tokenize:
+        count_batch = token_cache.count_many if token_cache is not None else count_tokens_batch
+        count_texts = lambda texts: count_batch(texts, num_threads=num_threads, tokenizer=tokenizer)
+        step = TOKENIZE_BATCH_SIZE
+    else:
+        count = token_cache.count if token_cache is not None else count_tokens
+        count_texts = lambda texts: [count(text, tokenizer) for text in texts]
+    if on_counted is None:
+        step = max(len(chunks), 1)
+    elif not chunks:
+        on_counted(0, token_stats)
+
+    texts = chunks.texts
+    for start in range(0, len(texts), step):
+        part = texts[start:start + step]
+        chunks.record_token_counts(start, count_texts(part), token_stats)
+        if on_counted is not None:
+            on_counted(start + len(part), token_stats)
+
+def new_token_stats():
+    return {
+        "total_tokens": 0,
+        "user_tokens": 0,
+        "model_tokens": 0,
+        "thinking_tokens": 0,
+        "message_count": 0,
+        "has_thinking": False
+    }
+
+def iter_segments(source_data, token_stats, summary=None):
+    # Yields (text, role, is_thought) for every non-empty text or thinking segment, in output order
+    for msg in source_data.get("chat_messages", []):
+        role = USER if msg["sender"] == "human" else MODEL
+        token_stats["message_count"] += 1
+        if summary is not None:
+            summarize_message(summary, msg)
+        
+        for segment in msg.get("content", []):
+            if segment["type"] == "thinking":
+                text = segment.get("thinking", "").strip()
+                if text:
+                    token_stats["has_thinking"] = True
+                    yield text, role, True
+
+            elif segment["type"] == "text":
+                text = segment.get("text", "").strip()
+                if text:
+                    yield text, role, False
+
+def describe_error(error):
+    if isinstance(error, KeyError):
+        return f"Missing required field - {error}"
+    return str(error)
+
+def export_entry_name(index, conversation):
+    name = conversation.get("name") if isinstance(conversation, dict) else None
+    slug = re.sub(r"[^\w-]+", "_", name or "").strip("_")[:60] or "conversation"
+    return f"{index + 1:04d}_{slug}_gemini.json"
+
+def convert_export(fp, open_output, indent=2, progress=None, json_backend="auto", split_tokens=None,
+                   split_overlap=0, **convert_options):
+    """Convert every conversation of a Claude account export to its own Gemini file.
+
+    open_output(name) must return a binary file-like context manager for one output.
+    progress(index, name, error) is called after each conversation. A conversation
+    that fails to convert is recorded in the returned stats' failed list and skipped;
+    conversation_count only counts the converted ones. json_backend
+    encodes the outputs (see cl2gi.jsonbackend). With split_tokens, each conversation
+    is written as parts, as in write_parts. Other
+    keyword arguments are passed to convert_claude_to_gemini.
+    """
+    export_stats = new_token_stats()
+    export_stats["conversation_count"] = 0
+    export_stats["failed"] = []
+
+    diagnostics = convert_options.get("diagnostics")
+    for index, conversation in enumerate(timed_iter(diagnostics, "parse", iter_conversations(fp))):
+        entry_name = export_entry_name(index, conversation)
+        error = None
+        try:
+            converted, token_stats = convert_claude_to_gemini(conversation, chunk_store=True, **convert_options)
+        except Exception as e:
+            error = describe_error(e)
+            export_stats["failed"].append((entry_name, error))
+        else:
+            with timed(diagnostics, "serialize"):
+                if split_tokens is None:
+                    with open_output(entry_name) as f:
+                        write_gemini(f, converted, indent, json_backend)
+                else:
+                    write_parts(open_output, entry_name, converted, token_stats, split_tokens, split_overlap,
+                                indent, json_backend)
+            for key, value in token_stats.items():
+                if isinstance(value, bool):
+                    export_stats[key] = export_stats.get(key, False) or value
+                elif isinstance(value, int):
+                    export_stats[key] = export_stats.get(key, 0) + value
+                else:
+                    export_stats[key] = value
+            export_stats["conversation_count"] += 1
+
+        if progress is not None:
+            progress(index, entry_name, error)
+
+    return export_stats
+
+def read_json(fp, diagnostics=None, json_backend="auto"):
+    # Same result as json.load on a binary file, with reading and parsing timed apart
+    loads = get_json_backend(json_backend).loads
+    with timed(diagnostics, "read"):
+        data = fp.read()
+    with timed(diagnostics, "parse"):
+        return loads(data)
+
+def export_output_path(output_path, zip_exports=False):
+    base = output_path[:-len(".json")] if output_path.endswith(".json") else output_path
+    return base + ".zip" if zip_exports else base
+
+def part_output_path(output_path, part_number):
+    return f"{_part_base(output_path)}.part{part_number:03d}.json"
+
+def part_output_pattern(output_path):
+    # The part paths of output_path as one name, for messages
+    return f"{_part_base(output_path)}.partNNN.json"
+
+def _part_base(output_path):
+    return output_path[:-len(".json")] if output_path.endswith(".json") else output_path
+
+def write_parts(open_output, output_name, converted, token_stats, max_tokens, overlap_tokens=0, indent=2,
+                json_backend="auto"):
+    """Split a converted conversation by token budget and write each part to its own file.
+
+    Parts are named by part_output_path and opened with open_output(name); see
+    cl2gi.budget.split_conversation. Records the part_count in token_stats and
+    returns the token stats of each part.
+    """
+    parts = split_conversation(converted, max_tokens, overlap_tokens)
+    part_stats = []
+    for part_number, (part, stats) in enumerate(parts, 1):
+        stats["output"] = part_output_path(output_name, part_number)
+        stats["token_mode"] = token_stats["token_mode"]
+        with open_output(stats["output"]) as f:
+            write_gemini(f, part, indent, json_backend)
+        part_stats.append(stats)
+    token_stats["part_count"] = len(part_stats)
+    return part_stats
+
+def convert_file(input_path, output_path, streaming=False, indent=2, zip_exports=False, json_backend="auto",
+                 split_tokens=None, split_overlap=0, **convert_options):
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(input_path, "rb") as f:
+        if sniff_top_level(f) == "[":
+            # Per-conversation events would restart for every conversation of the export
+            convert_options.pop("progress", None)
+            return _convert_export_file(f, export_output_path(output_path, zip_exports), zip_exports,
+                                        indent=indent, json_backend=json_backend, split_tokens=split_tokens,
+                                        split_overlap=split_overlap, **convert_options)
+        diagnostics = convert_options.get("diagnostics")
+        if streaming:
+            # Messages are decoded lazily, so parsing is part of the "chunks" stage
+            source_data = load_conversation(f)
+        else:
+            source_data = read_json(f, diagnostics, json_backend)
+        converted, token_stats = convert_claude_to_gemini(source_data, chunk_store=True, **convert_options)
+
+    with timed(diagnostics, "serialize"):
+        if split_tokens is None:
+            with open(output_path, "wb") as f:
+                write_gemini(f, converted, indent, json_backend)
+        else:
+            token_stats["parts"] = write_parts(lambda name: open(name, "wb"), output_path, converted, token_stats,
+                                               split_tokens, split_overlap, indent, json_backend)
+
+    return token_stats
+
+def _convert_export_file(fp, export_path, zip_exports, **options):
+    if zip_exports:
+        with zipfile.ZipFile(export_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            return convert_export(fp, lambda name: archive.open(name, "w"), **options)
+
+    os.makedirs(export_path, exist_ok=True)
+    return convert_export(fp, lambda name: open(os.path.join(export_path, name), "wb"), **options)
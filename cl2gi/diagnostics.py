@@ -0,0 +1,111 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# tracemalloc is process-wide: it runs while any timer is inside run() and stops after the last run ends
+_tracing_users = 0
+_started_tracing = False
+_tracing_lock = threading.Lock()
+
+def acquire_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+
+def release_tracing():
+    # Tracing started outside cl2gi, such as with python -X tracemalloc, is left running
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+class StageTimer:
+    """Wall time, CPU time and tracemalloc peak per named pipeline stage.
+
+    Stages that run more than once (one per conversation of an export, say)
+    accumulate their times and keep the largest peak. With trace_memory, tracemalloc
+    runs while the timer is inside run(), which wraps one pipeline run; tracing slows
+    allocation-heavy code down several times, so it never outlives the runs that asked
+    for it. Stages outside a run, or during which tracing stopped, record no peak.
+    CPU time and peaks are process-wide: they include helper threads, such as those of
+    batched tokenization, and any other conversion running at the same time, whose
+    stages also reset the peak.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - start_wall
+            cpu_seconds = time.process_time() - start_cpu
+            tracing = tracing and tracemalloc.is_tracing()
+            peak_bytes = tracemalloc.get_traced_memory()[1] - start_memory if tracing else None
+            with self._lock:
+                record = self.stages.setdefault(name, {
+                    "calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_bytes": None
+                })
+                record["calls"] += 1
+                record["wall_seconds"] += wall_seconds
+                record["cpu_seconds"] += cpu_seconds
+                if peak_bytes is not None:
+                    record["peak_bytes"] = max(record["peak_bytes"] or 0, peak_bytes)
+
+    def report(self):
+        with self._lock:
+            return {name: dict(record) for name, record in self.stages.items()}
+
+    def clear(self):
+        with self._lock:
+            self.stages.clear()
+
+    @contextmanager
+    def run(self):
+        # Traces memory for one pipeline run; tracemalloc stops once no other run needs it
+        if not self.trace_memory:
+            yield self
+            return
+        acquire_tracing()
+        try:
+            yield self
+        finally:
+            release_tracing()
+
+def timed(timer, name):
+    # Lets call sites time a stage without checking whether diagnostics are on
+    return timer.stage(name) if timer is not None else nullcontext()
+
+def traced_run(timer):
+    # Like timed, for StageTimer.run
+    return timer.run() if timer is not None else nullcontext()
+
+def timed_iter(timer, name, iterable):
+    # Times each step of a lazy iterable, such as the conversations of a streamed export
+    if timer is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        with timer.stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import time
+
+from cl2gi.chunks import ChunkStore
+from cl2gi.converter import (ProgressReporter, convert_file, count_chunk_tokens, iter_segments,
+                             new_gemini_document, new_token_stats, read_json)
+from cl2gi.diagnostics import timed
+from cl2gi.jsonbackend import get_json_backend
+from cl2gi.stream import gemini_layout, load_conversation, sniff_top_level
+from cl2gi.tokenizer import DEFAULT_TOKENIZER, TOKEN_MODES, check_tokenizer
+
+MANIFEST_VERSION = 1
+# Cumulative values stored per message, after the digest and the output offset
+TOTAL_KEYS = ("chunk_count", "total_tokens", "user_tokens", "model_tokens", "thinking_tokens", "has_thinking")
+
+def manifest_path_for(output_path):
+    base = output_path[:-len(".json")] if output_path.endswith(".json") else output_path
+    return base + ".manifest.json"
+
+def message_digest(msg):
+    # Only the fields the conversion reads, so metadata-only edits keep the message
+    payload = json.dumps([msg.get("sender"), msg.get("content")], sort_keys=True, ensure_ascii=False)
+    # surrogatepass: json.loads turns escapes of a cut-off emoji into lone surrogates
+    return hashlib.blake2b(payload.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+def load_manifest(manifest_path, output_path, settings):
+    # Returns None unless the manifest matches these settings and the output it describes
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != settings
+                or os.path.getsize(output_path) != manifest["size"]):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return manifest
+
+def _write_manifest(manifest_path, manifest):
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(temp_path, manifest_path)
+
+def _plan(messages, old_messages, include_token_count):
+    # Digests every message; chunks are only built from the first changed message on.
+    # Returns the digests, the number of kept messages, the new chunks and where each new message starts.
+    digests = []
+    kept = 0
+    new_chunks = ChunkStore(include_token_count)
+    message_starts = []
+    token_stats = new_token_stats()
+    for msg in messages:
+        digest = message_digest(msg)
+        index = len(digests)
+        digests.append(digest)
+        if kept == index and index < len(old_messages) and old_messages[index][0] == digest:
+            kept += 1
+            continue
+        message_starts.append(len(new_chunks))
+        for text, role, is_thought in iter_segments({"chat_messages": [msg]}, token_stats):
+            new_chunks.append(text, role, is_thought)
+    return digests, kept, new_chunks, message_starts
+
+def convert_file_incremental(input_path, output_path, streaming=False, indent=2, zip_exports=False,
+                             token_mode="exact", manifest_path=None, progress=None, diagnostics=None,
+                             json_backend="auto", tokenizer=DEFAULT_TOKENIZER, **convert_options):
+    """Re-convert a growing conversation, appending only new or changed messages.
+
+    A manifest next to the output records the conversation uuid and, per message,
+    a content digest and the output offset after its chunks. On a re-run the output
+    is truncated after the last unchanged leading message and only the rest is
+    tokenized and written. Without a usable manifest (first run, other settings,
+    another conversation, or an output changed since) the file is fully rewritten.
+    Account exports are converted in full by convert_file. progress(event) reports
+    the messages being converted, as in convert_claude_to_gemini.
+    """
+    started = time.perf_counter()
+    if token_mode not in TOKEN_MODES:
+        raise ValueError(f"Invalid token mode {token_mode!r}: expected one of {', '.join(TOKEN_MODES)}")
+    check_tokenizer(tokenizer)
+    if manifest_path is None:
+        manifest_path = manifest_path_for(output_path)
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    settings = {"indent": indent, "token_mode": token_mode, "encoding": tokenizer}
+    manifest = load_manifest(manifest_path, output_path, settings)
+    old_messages = manifest["messages"] if manifest is not None else []
+
+    with open(input_path, "rb") as f:
+        if sniff_top_level(f) == "[":
+            return convert_file(input_path, output_path, streaming=streaming, indent=indent,
+                                zip_exports=zip_exports, token_mode=token_mode, progress=progress,
+                                diagnostics=diagnostics, json_backend=json_backend, tokenizer=tokenizer,
+                                **convert_options)
+        source_data = load_conversation(f) if streaming else read_json(f, diagnostics, json_backend)
+        if not isinstance(source_data, dict) or "chat_messages" not in source_data:
+            raise ValueError("Invalid input: Expected a JSON object with 'chat_messages' field")
+        with timed(diagnostics, "chunks"):
+            digests, kept, new_chunks, message_starts = _plan(source_data["chat_messages"], old_messages,
+                                                              token_mode != "off")
+
+        # The uuid may follow chat_messages in a streamed file, so it is checked afterwards
+        uuid = source_data.get("uuid")
+        if manifest is not None and manifest.get("uuid") != uuid:
+            old_messages = []
+            if kept:
+                f.seek(0)
+                source_data = load_conversation(f) if streaming else read_json(f, json_backend=json_backend)
+                digests, kept, new_chunks, message_starts = _plan(source_data["chat_messages"], old_messages,
+                                                              token_mode != "off")
+
+    reporter = ProgressReporter(progress, message_starts, new_chunks, started) if progress is not None else None
+    with timed(diagnostics, "tokenize"):
+        count_chunk_tokens(new_chunks, new_token_stats(), token_mode, on_counted=reporter, tokenizer=tokenizer,
+                           **convert_options)
+
+    dumps_string = get_json_backend(json_backend).dumps_string
+    head, item_prefix, tail, empty_tail = gemini_layout(new_gemini_document(), indent)
+    records = [list(record) for record in old_messages[:kept]]
+    totals = dict(zip(TOTAL_KEYS, records[-1][2:])) if records else dict.fromkeys(TOTAL_KEYS, 0)
+    totals["has_thinking"] = bool(totals["has_thinking"])
+
+    # A crash while writing leaves no manifest behind, forcing a full rewrite next time
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    with timed(diagnostics, "serialize"), open(output_path, "r+b" if records else "wb") as out:
+        if records:
+            out.seek(records[-1][1])
+            out.truncate()
+        else:
+            out.write(head.encode("utf-8"))
+        position = out.tell()
+
+        message_ends = message_starts[1:] + [len(new_chunks)]
+        for digest, start, end in zip(digests[kept:], message_starts, message_ends):
+            for index in range(start, end):
+                separator = "," if totals["chunk_count"] else ""
+                piece = separator + new_chunks.dumps(index, indent, item_prefix, dumps_string)
+                data = piece.encode("utf-8")
+                out.write(data)
+                position += len(data)
+                totals["chunk_count"] += 1
+                new_chunks.tally(index, totals)
+                totals["has_thinking"] = totals["has_thinking"] or bool(new_chunks.thoughts[index])
+            records.append([digest, position] + [totals[key] for key in TOTAL_KEYS])
+
+        out.write((tail if totals["chunk_count"] else empty_tail).encode("utf-8"))
+        size = out.tell()
+
+    _write_manifest(manifest_path, {
+        "version": MANIFEST_VERSION,
+        "uuid": uuid,
+        "settings": settings,
+        "size": size,
+        "messages": records,
+    })
+
+    token_stats = new_token_stats()
+    token_stats.update((key, totals[key]) for key in TOTAL_KEYS if key in token_stats)
+    token_stats["message_count"] = len(digests)
+    token_stats["token_mode"] = token_mode
+    token_stats["reused_messages"] = kept
+    return token_stats
@@ -0,0 +1,72 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# In order of preference for "auto", fastest first
+JSON_BACKENDS = ("auto", "msgspec", "orjson", "json")
+
+class JsonBackend:
+    """Parsing and string encoding with the same results as the json module.
+
+    loads(data) parses a document from bytes; documents the fast parsers reject
+    (lone surrogates, NaN, UTF-16, a byte order mark) are parsed by json. orjson
+    reads integers beyond 64 bits as floats. dumps_string(text) returns exactly
+    json.dumps(text): orjson and msgspec write non-ASCII characters and DEL
+    unescaped where json escapes them, so such texts go to json's encoder.
+    """
+
+    __slots__ = ("name", "loads", "dumps_string")
+
+    def __init__(self, name, loads, dumps_string):
+        self.name = name
+        self.loads = loads
+        self.dumps_string = dumps_string
+
+def _orjson_loads(data):
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+def _orjson_dumps_string(text):
+    if text.isascii() and "\x7f" not in text:
+        return orjson.dumps(text).decode()
+    return encode_basestring_ascii(text)
+
+def _msgspec_loads(data):
+    try:
+        return msgspec.json.decode(data)
+    except msgspec.DecodeError:
+        return json.loads(data)
+
+def _msgspec_dumps_string(text):
+    if text.isascii() and "\x7f" not in text:
+        return msgspec.json.encode(text).decode()
+    return encode_basestring_ascii(text)
+
+_backends = {"json": JsonBackend("json", json.loads, encode_basestring_ascii)}
+if orjson is not None:
+    _backends["orjson"] = JsonBackend("orjson", _orjson_loads, _orjson_dumps_string)
+if msgspec is not None:
+    _backends["msgspec"] = JsonBackend("msgspec", _msgspec_loads, _msgspec_dumps_string)
+
+def available_backends():
+    return [name for name in JSON_BACKENDS[1:] if name in _backends]
+
+def get_json_backend(name="auto"):
+    if name == "auto":
+        return _backends[available_backends()[0]]
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"Invalid JSON backend {name!r}: expected one of {', '.join(JSON_BACKENDS)}")
+    if name not in _backends:
+        raise ValueError(f"JSON backend {name!r} is not installed")
+    return _backends[name]
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from cl2gi.converter import convert_claude_to_gemini, describe_error, read_json
+from cl2gi.stream import iter_gemini_json, load_conversation, sniff_top_level
+from cl2gi.tokencache import DEFAULT_MAX_ENTRIES, TokenCountCache
+from cl2gi.tokenizer import DEFAULT_TOKENIZE_THREADS, DEFAULT_TOKENIZER, TOKEN_MODES, TOKENIZERS, load_tokenizer
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_PENDING = 16
+DEFAULT_MAX_BODY_BYTES = 512 * 1024 * 1024
+# Request bodies up to this size stay in memory, larger ones spill to a temp file
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024
+RESPONSE_BUFFER_BYTES = 1 << 16
+
+class ConversionService:
+    """Admission control and the executor shared by every /convert request.
+
+    At most max_concurrency requests read their body, convert and send their response
+    at the same time; a slot is held until the response body is sent or the client
+    goes away. Up to max_pending more wait for a slot without their body being read,
+    so slow clients are held back by TCP flow control. Anything beyond that gets a 503.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_pending=DEFAULT_MAX_PENDING,
+                 workers=None, max_body_bytes=DEFAULT_MAX_BODY_BYTES, token_cache=None,
+                 max_tokenize_threads=DEFAULT_TOKENIZE_THREADS):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_body_bytes = max_body_bytes
+        self.max_tokenize_threads = max_tokenize_threads
+        self.token_cache = token_cache
+        self.executor = ThreadPoolExecutor(max_workers=workers or max_concurrency,
+                                           thread_name_prefix="cl2gi-convert")
+        self.admitted = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self._slots = None
+
+    def slots(self):
+        # Created lazily so the semaphore belongs to the server's event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._slots
+
+    def release(self):
+        # Frees the slot of an admitted request once it failed or its response ended
+        self.active -= 1
+        self.admitted -= 1
+        self._slots.release()
+
+    def convert(self, body, *, streaming=False, **convert_options):
+        # convert_options are passed on to convert_claude_to_gemini, with the service's token cache
+        if sniff_top_level(body) == "[":
+            raise ValueError("Account exports are not supported by /convert; post one conversation at a time")
+        source_data = load_conversation(body) if streaming else read_json(body)
+        return convert_claude_to_gemini(source_data, token_cache=self.token_cache, chunk_store=True,
+                                        **convert_options)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        if self.token_cache is not None:
+            self.token_cache.close()
+
+def _flag(request, name):
+    return request.query_params.get(name, "").lower() in ("1", "true", "yes")
+
+def _error(status, message, headers=None):
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+def _iter_response(converted, indent):
+    # Pieces are grouped into larger writes; runs in Starlette's thread pool
+    buffer = []
+    size = 0
+    for piece in iter_gemini_json(converted, indent):
+        data = piece.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= RESPONSE_BUFFER_BYTES:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+async def _stream_response(service, converted, indent):
+    # The converted chunks stay in memory until sent, so the request keeps its slot until then
+    try:
+        async for data in iterate_in_threadpool(_iter_response(converted, indent)):
+            yield data
+        service.completed += 1
+    finally:
+        service.release()
+
+async def convert_endpoint(request):
+    """POST /convert: Claude conversation JSON in, Gemini JSON out.
+
+    Query parameters: token_mode (exact, approximate or off), tokenizer, compact, batch_tokenize,
+    parallel_tokenize, tokenize_threads and streaming. Token statistics are returned in X-Cl2gi-* headers.
+    """
+    service = request.app.state.service
+    token_mode = request.query_params.get("token_mode", "exact")
+    if token_mode not in TOKEN_MODES:
+        return _error(400, f"Invalid token mode {token_mode!r}: expected one of {', '.join(TOKEN_MODES)}")
+    tokenizer = request.query_params.get("tokenizer", DEFAULT_TOKENIZER)
+    if tokenizer not in TOKENIZERS:
+        return _error(400, f"Invalid tokenizer {tokenizer!r}: expected one of {', '.join(TOKENIZERS)}")
+    try:
+        num_threads = int(request.query_params.get("tokenize_threads", DEFAULT_TOKENIZE_THREADS))
+    except ValueError:
+        return _error(400, "tokenize_threads must be an integer")
+    if not 1 <= num_threads <= service.max_tokenize_threads:
+        return _error(400, f"tokenize_threads must be between 1 and {service.max_tokenize_threads}")
+    indent = None if _flag(request, "compact") else 2
+
+    if service.admitted >= service.max_concurrency + service.max_pending:
+        service.rejected += 1
+        return _error(503, "Too many conversions in progress, retry later", headers={"Retry-After": "1"})
+
+    service.admitted += 1
+    try:
+        await service.slots().acquire()
+    except BaseException:
+        service.admitted -= 1
+        raise
+    service.active += 1
+    response = None
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES) as body:
+            received = 0
+            async for data in request.stream():
+                received += len(data)
+                if received > service.max_body_bytes:
+                    return _error(413, f"Request body exceeds {service.max_body_bytes:,} bytes")
+                body.write(data)
+            body.seek(0)
+
+            loop = asyncio.get_running_loop()
+            converted, token_stats = await loop.run_in_executor(service.executor, partial(
+                service.convert, body, streaming=_flag(request, "streaming"), token_mode=token_mode,
+                batch_tokenize=_flag(request, "batch_tokenize"), num_threads=num_threads,
+                parallel_tokenize=_flag(request, "parallel_tokenize"), tokenizer=tokenizer
+            ))
+
+        headers = {
+            "X-Cl2gi-Message-Count": str(token_stats["message_count"]),
+            "X-Cl2gi-Token-Mode": token_mode,
+        }
+        if token_mode == "exact":
+            headers["X-Cl2gi-Tokenizer"] = tokenizer
+        if token_mode != "off":
+            for key in ("total_tokens", "user_tokens", "model_tokens", "thinking_tokens"):
+                headers["X-Cl2gi-" + key.replace("_", "-").title()] = str(token_stats[key])
+        response = StreamingResponse(_stream_response(service, converted, indent), media_type="application/json",
+                                     headers=headers)
+        return response
+    except json.JSONDecodeError as e:
+        return _error(400, f"Invalid JSON: {e}")
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        # Wrong types in otherwise valid JSON surface as TypeError or AttributeError
+        return _error(422, describe_error(e))
+    except RuntimeError as e:
+        # A tokenizer other than the preloaded one could not be loaded
+        return _error(503, str(e))
+    finally:
+        if response is None:
+            service.release()
+
+async def health_endpoint(request):
+    service = request.app.state.service
+    return JSONResponse({
+        "active": service.active,
+        "pending": service.admitted - service.active,
+        "completed": service.completed,
+        "rejected": service.rejected,
+    })
+
+def create_app(service=None):
+    service = service or ConversionService()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Load the default tokenizer before the first request instead of inside it; others load on first use
+        await asyncio.get_running_loop().run_in_executor(service.executor, load_tokenizer)
+        yield
+        # Runs after the server stopped accepting and in-flight requests finished
+        await asyncio.get_running_loop().run_in_executor(None, service.shutdown)
+
+    app = Starlette(
+        routes=[
+            Route("/convert", convert_endpoint, methods=["POST"]),
+            Route("/healthz", health_endpoint, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.service = service
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m cl2gi.service",
+        description="Serve POST /convert: Claude chat JSON in, Gemini chunkedPrompt JSON out."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"Conversions running at once (default: {DEFAULT_MAX_CONCURRENCY})")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help=f"Requests allowed to wait for a slot before answering 503 "
+                             f"(default: {DEFAULT_MAX_PENDING})")
+    parser.add_argument("--workers", type=int,
+                        help="Converter threads (default: --max-concurrency)")
+    parser.add_argument("--max-body-mb", type=int, default=DEFAULT_MAX_BODY_BYTES // (1024 * 1024),
+                        help="Largest accepted request body in MB (default: %(default)s)")
+    parser.add_argument("--max-tokenize-threads", type=int, default=DEFAULT_TOKENIZE_THREADS,
+                        help=f"Largest tokenize_threads a request may ask for (default: {DEFAULT_TOKENIZE_THREADS})")
+    parser.add_argument("--token-cache", metavar="PATH",
+                        help="Persist exact token counts in this SQLite file")
+    parser.add_argument("--token-cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help=f"In-memory token-count cache entries, 0 to disable (default: {DEFAULT_MAX_ENTRIES:,})")
+    parser.add_argument("--shutdown-timeout", type=int, default=30,
+                        help="Seconds to let in-flight requests finish after SIGTERM (default: 30)")
+    args = parser.parse_args(argv)
+
+    token_cache = None
+    if args.token_cache_size > 0 or args.token_cache:
+        token_cache = TokenCountCache(max_entries=max(args.token_cache_size, 0), path=args.token_cache)
+    service = ConversionService(args.max_concurrency, args.max_pending, args.workers,
+                                args.max_body_mb * 1024 * 1024, token_cache, args.max_tokenize_threads)
+    # uvicorn stops accepting on SIGINT/SIGTERM and waits for in-flight requests before the lifespan shutdown
+    uvicorn.run(create_app(service), host=args.host, port=args.port,
+                timeout_graceful_shutdown=args.shutdown_timeout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import codecs
+import json
+
+from cl2gi.chunks import ChunkStore
+from cl2gi.jsonbackend import get_json_backend
+
+READ_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789.eE+-"
+
+_decoder = json.JSONDecoder()
+
+class _Reader:
+    def __init__(self, fp, read_size=READ_SIZE):
+        self.fp = fp
+        self.read_size = read_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._text_decoder = None
+
+    def fill(self, size=None):
+        data = self.fp.read(size or self.read_size)
+        if not data:
+            self.eof = True
+            if self._text_decoder is not None:
+                self.buf = self.buf[self.pos:] + self._text_decoder.decode(b"", final=True)
+                self.pos = 0
+            return False
+        if isinstance(data, bytes):
+            if self._text_decoder is None:
+                self._text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+            data = self._text_decoder.decode(data)
+        # Drop the consumed prefix so the buffer only holds the value being decoded
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == "" or char not in chars:
+            found = repr(char) if char else "end of file"
+            raise json.JSONDecodeError(f"Expected one of {chars!r}, found {found}", self.buf, self.pos)
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        size = self.read_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number is complete only once a character that cannot continue it follows
+                if self.eof or (end < len(self.buf) and not (
+                        isinstance(value, (int, float)) and self.buf[end] in NUMBER_CHARS)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill(size)
+            # Grow reads geometrically so a huge value is re-scanned only O(log n) times
+            size *= 2
+
+    def finish(self):
+        if self.peek() != "":
+            raise json.JSONDecodeError("Extra data", self.buf, self.pos)
+
+def _iter_members(reader, target):
+    # Parses "key": value pairs into target up to the closing brace, stopping early at chat_messages
+    if reader.peek() == "}":
+        reader.pos += 1
+        return False
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", reader.buf, reader.pos)
+        reader.expect(":")
+        if key == "chat_messages" and reader.peek() == "[":
+            return True
+        target[key] = reader.value()
+        if reader.expect(",}") == "}":
+            return False
+
+def _iter_array(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(",]") == "]":
+            return
+
+def _iter_messages(reader, source_data):
+    yield from _iter_array(reader)
+
+    # Metadata that follows chat_messages becomes available once the messages are exhausted
+    if reader.expect(",}") == ",":
+        if _iter_members(reader, source_data):
+            raise ValueError("Invalid input: duplicate 'chat_messages' field")
+    reader.finish()
+
+def load_conversation(fp, read_size=READ_SIZE):
+    """Incrementally parse a Claude conversation from a text or binary file object.
+
+    Returns a dict with the top-level fields seen before chat_messages; its
+    "chat_messages" entry is a generator that decodes one message at a time,
+    so memory stays proportional to the largest message rather than the file.
+    """
+    reader = _Reader(fp, read_size)
+    if reader.peek() != "{":
+        raise ValueError("Invalid input: Expected a JSON object with 'chat_messages' field")
+    reader.pos += 1
+
+    source_data = {}
+    if _iter_members(reader, source_data):
+        source_data["chat_messages"] = _iter_messages(reader, source_data)
+    else:
+        reader.finish()
+    return source_data
+
+def iter_conversations(fp, read_size=READ_SIZE):
+    """Incrementally parse a Claude account export (a JSON array of conversations).
+
+    Conversations are yielded one at a time, so memory stays proportional to the
+    largest conversation rather than the whole export.
+    """
+    reader = _Reader(fp, read_size)
+    if reader.peek() != "[":
+        raise ValueError("Invalid input: Expected a JSON array of conversations")
+    yield from _iter_array(reader)
+    reader.finish()
+
+def sniff_top_level(fp):
+    # Returns the first significant character ("{" for a conversation, "[" for an export) and rewinds fp
+    position = fp.tell()
+    char = _Reader(fp, 4096).peek()
+    fp.seek(position)
+    return char
+
+_CHUNKS_PLACEHOLDER = "\x00cl2gi-chunks\x00"
+
+def _dumps(value, indent):
+    if indent is None:
+        return json.dumps(value, separators=(",", ":"))
+    return json.dumps(value, indent=indent)
+
+def gemini_layout(converted, indent=2):
+    """Split the serialized document around its chunks list.
+
+    Returns (head, item_prefix, tail, empty_tail): the text before the first chunk,
+    the whitespace put before every chunk, and the footer after a non-empty or an
+    empty chunks list.
+    """
+    skeleton = dict(converted)
+    skeleton["chunkedPrompt"] = dict(converted["chunkedPrompt"], chunks=[_CHUNKS_PLACEHOLDER])
+    text = _dumps(skeleton, indent)
+
+    placeholder = json.dumps(_CHUNKS_PLACEHOLDER)
+    start = text.index(placeholder)
+    tail = text[start + len(placeholder):]
+    if indent is None:
+        return text[:start], "", tail, tail
+    line_start = text.rindex("\n", 0, start)
+    return text[:line_start], text[line_start:start], tail, tail[tail.index("]"):]
+
+def dumps_chunk(chunk, indent, item_prefix):
+    chunk_text = _dumps(chunk, indent)
+    if item_prefix:
+        chunk_text = chunk_text.replace("\n", item_prefix)
+    return item_prefix + chunk_text
+
+def iter_gemini_json(converted, indent=2, json_backend="auto"):
+    """Serialize a converted document piece by piece: header, one piece per chunk, footer.
+
+    With an indent the joined pieces are identical to json.dumps(converted, indent=indent);
+    indent=None produces compact output without whitespace. The chunks list may be
+    any iterable and is consumed once; a ChunkStore is serialized without building dicts,
+    its texts encoded by json_backend.
+    """
+    head, item_prefix, tail, empty_tail = gemini_layout(converted, indent)
+    chunks = converted["chunkedPrompt"]["chunks"]
+    if isinstance(chunks, ChunkStore):
+        pieces = chunks.iter_json(indent, item_prefix, get_json_backend(json_backend).dumps_string)
+    else:
+        pieces = (dumps_chunk(chunk, indent, item_prefix) for chunk in chunks)
+
+    yield head
+    separator = ""
+    for piece in pieces:
+        yield separator + piece
+        separator = ","
+    yield tail if separator else empty_tail
+
+def write_gemini(fp, converted, indent=2, json_backend="auto"):
+    # fp must be opened in binary mode
+    for piece in iter_gemini_json(converted, indent, json_backend):
+        fp.write(piece.encode("utf-8"))
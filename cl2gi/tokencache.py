@@ -0,0 +1,141 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from cl2gi.tokenizer import DEFAULT_TOKENIZE_THREADS, DEFAULT_TOKENIZER, count_tokens, count_tokens_batch
+
+DEFAULT_MAX_ENTRIES = 100_000
+FLUSH_EVERY = 1000
+
+def text_digest(text):
+    # surrogatepass: json.loads turns escapes of a cut-off emoji into lone surrogates
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+class TokenCountCache:
+    """Content-addressed token counts: (tokenizer, blake2b of the segment text) -> count.
+
+    Keeps up to max_entries counts in an in-memory LRU. With a path, counts are
+    also persisted to a SQLite file, namespaced by tokenizer, so later runs over
+    mostly unchanged inputs skip tokenization; call flush() or close() to write
+    pending counts.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, path=None):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS token_counts ("
+                "namespace TEXT NOT NULL, digest BLOB NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (namespace, digest))"
+            )
+            self._db.commit()
+
+    def _remember(self, key, count):
+        self._entries[key] = count
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key):
+        # Caller holds the lock; key is (tokenizer, digest)
+        count = self._entries.get(key)
+        if count is not None:
+            self._entries.move_to_end(key)
+            return count
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT count FROM token_counts WHERE namespace = ? AND digest = ?", key
+            ).fetchone()
+            if row is not None:
+                self._remember(key, row[0])
+                return row[0]
+        return None
+
+    def _store(self, key, count):
+        # Caller holds the lock
+        self._remember(key, count)
+        if self._db is not None:
+            self._pending.append(key + (count,))
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush_pending()
+
+    def count(self, text, tokenizer=DEFAULT_TOKENIZER):
+        if not text:
+            return 0
+        key = (tokenizer, text_digest(text))
+        with self._lock:
+            count = self._lookup(key)
+            if count is not None:
+                self.hits += 1
+                return count
+            self.misses += 1
+
+        count = count_tokens(text, tokenizer)
+        with self._lock:
+            self._store(key, count)
+        return count
+
+    def count_many(self, texts, num_threads=DEFAULT_TOKENIZE_THREADS, tokenizer=DEFAULT_TOKENIZER,
+                   batch_counter=count_tokens_batch):
+        keys = [(tokenizer, text_digest(text)) for text in texts]
+        counts = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for index, key in enumerate(keys):
+                count = self._lookup(key)
+                if count is not None:
+                    counts[index] = count
+                    self.hits += 1
+                else:
+                    # Repeated texts within one batch are tokenized once
+                    missing.setdefault(key, []).append(index)
+            self.misses += len(missing)
+            self.hits += sum(len(indexes) - 1 for indexes in missing.values())
+
+        if missing:
+            missing_texts = [texts[indexes[0]] for indexes in missing.values()]
+            new_counts = batch_counter(missing_texts, num_threads=num_threads, tokenizer=tokenizer)
+            with self._lock:
+                for (key, indexes), count in zip(missing.items(), new_counts):
+                    self._store(key, count)
+                    for index in indexes:
+                        counts[index] = count
+        return counts
+
+    def _flush_pending(self):
+        if self._pending:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO token_counts (namespace, digest, count) VALUES (?, ?, ?)",
+                self._pending
+            )
+            self._db.commit()
+            self._pending = []
+
+    def flush(self):
+        if self._db is not None:
+            with self._lock:
+                self._flush_pending()
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
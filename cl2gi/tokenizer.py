@@ -0,0 +1,195 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# tiktoken encodings: where tiktoken downloads each ranks file from, and its SHA-256 as tiktoken checks it
+TIKTOKEN_ENCODINGS = {
+    "cl100k_base": ("https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+                    "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7"),
+    "o200k_base": ("https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+                   "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d"),
+}
+GEMINI_ESTIMATE = "gemini-estimate"
+TOKENIZERS = tuple(TIKTOKEN_ENCODINGS) + (GEMINI_ESTIMATE,)
+DEFAULT_TOKENIZER = "cl100k_base"
+# Local copies of ranks files, separated by os.pathsep, installed into tiktoken's cache on first use
+RANKS_FILE_ENV = "CL2GI_RANKS_FILE"
+DEFAULT_TOKENIZE_THREADS = min(8, os.cpu_count() or 1)
+# Size of the one pool parallel tokenization runs on; more threads than cores would not help
+PARALLEL_POOL_THREADS = os.cpu_count() or 1
+TOKENIZE_BATCH_SIZE = 4096
+# Parallel tokenization hands each thread a few slices, so one long segment does not hold up the rest
+PARALLEL_SLICES_PER_THREAD = 4
+TOKEN_MODES = ("exact", "approximate", "off")
+
+# Measured against cl100k_base on whole documents: Markdown and mixed prose land
+# within ±12% of the exact count for 80% of documents (median +1%), and Rust code
+# likewise. Plain English prose in common words is overcounted by 20-37% (this
+# repo's LICENSE by 32%), and Python source by about 15% (up to 34%). Text dominated
+# by digits, hex, base64, emoji or CJK is undercounted by 35-65%, and long runs of
+# whitespace can be overcounted several times over. Use "exact" wherever the count matters.
+APPROX_BYTES_PER_TOKEN = 3.8
+# Google documents a Gemini token as about four characters. Not fitted against Gemini's own
+# tokenizer, which is not available offline; expect larger errors on code and non-Latin scripts.
+GEMINI_CHARS_PER_TOKEN = 4.0
+
+_encoders = {}
+_encoder_load_seconds = {}
+_encoder_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+def tiktoken_cache_dir():
+    # Same lookup as tiktoken; an empty value disables its cache
+    for name in ("TIKTOKEN_CACHE_DIR", "DATA_GYM_CACHE_DIR"):
+        if name in os.environ:
+            return os.environ[name]
+    return os.path.join(tempfile.gettempdir(), "data-gym-cache")
+
+def cached_ranks_path(encoding_name=DEFAULT_TOKENIZER, cache_dir=None):
+    # tiktoken stores a download under the SHA-1 of its URL
+    cache_dir = tiktoken_cache_dir() if cache_dir is None else cache_dir
+    url = TIKTOKEN_ENCODINGS[encoding_name][0]
+    return os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest())
+
+def install_ranks_file(ranks_file, cache_dir=None):
+    """Copy a local .tiktoken ranks file into tiktoken's cache so loading needs no network.
+
+    The encoding is recognized by the SHA-256 tiktoken expects. Returns its name.
+    """
+    cache_dir = tiktoken_cache_dir() if cache_dir is None else cache_dir
+    if not cache_dir:
+        raise ValueError("TIKTOKEN_CACHE_DIR is empty, which disables tiktoken's cache")
+    with open(ranks_file, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    for encoding_name, (_, sha256) in TIKTOKEN_ENCODINGS.items():
+        if digest == sha256:
+            break
+    else:
+        raise ValueError(f"{ranks_file} is not a known ranks file ({', '.join(TIKTOKEN_ENCODINGS)}): "
+                         f"its SHA-256 does not match")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = cached_ranks_path(encoding_name, cache_dir)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, cache_path)
+    return encoding_name
+
+def _load_encoder(encoding_name):
+    import tiktoken
+    ranks_files = os.environ.get(RANKS_FILE_ENV)
+    if ranks_files and not os.path.exists(cached_ranks_path(encoding_name)):
+        for ranks_file in ranks_files.split(os.pathsep):
+            try:
+                install_ranks_file(ranks_file)
+            except (OSError, ValueError) as e:
+                raise RuntimeError(
+                    f"{RANKS_FILE_ENV} names {ranks_file}, which could not be installed: {e}. Point it at an "
+                    f"unmodified .tiktoken ranks file, or pre-load the cache with python -m cl2gi.warmup"
+                ) from e
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        if os.path.exists(cached_ranks_path(encoding_name)):
+            raise RuntimeError(
+                f"{encoding_name} could not be loaded from the tiktoken cache "
+                f"({cached_ranks_path(encoding_name)}): {e}. Delete that file and pre-load the cache again "
+                f"with python -m cl2gi.warmup"
+            ) from e
+        raise RuntimeError(
+            f"{encoding_name} is not in the tiktoken cache ({tiktoken_cache_dir()}) and could not be "
+            f"downloaded: {e}. On offline hosts set {RANKS_FILE_ENV} to a local copy of the ranks file, "
+            f"or pre-load the cache with python -m cl2gi.warmup"
+        ) from e
+
+def get_encoder(encoding_name=DEFAULT_TOKENIZER):
+    # Each tiktoken encoding is loaded on first use and kept for the life of the process
+    encoder = _encoders.get(encoding_name)
+    if encoder is None:
+        if encoding_name not in TIKTOKEN_ENCODINGS:
+            raise ValueError(f"Unknown tiktoken encoding {encoding_name!r}: "
+                             f"expected one of {', '.join(TIKTOKEN_ENCODINGS)}")
+        with _encoder_lock:
+            encoder = _encoders.get(encoding_name)
+            if encoder is None:
+                start = time.perf_counter()
+                encoder = _load_encoder(encoding_name)
+                _encoder_load_seconds[encoding_name] = time.perf_counter() - start
+                _encoders[encoding_name] = encoder
+    return encoder
+
+def check_tokenizer(tokenizer):
+    if tokenizer not in TOKENIZERS:
+        raise ValueError(f"Invalid tokenizer {tokenizer!r}: expected one of {', '.join(TOKENIZERS)}")
+
+def load_tokenizer(tokenizer=DEFAULT_TOKENIZER):
+    # Loads what the tokenizer needs up front; estimators need nothing
+    check_tokenizer(tokenizer)
+    if tokenizer in TIKTOKEN_ENCODINGS:
+        get_encoder(tokenizer)
+
+def encoder_load_seconds(encoding_name=DEFAULT_TOKENIZER):
+    return _encoder_load_seconds.get(encoding_name)
+
+def count_tokens(text, tokenizer=DEFAULT_TOKENIZER):
+    if not text:
+        return 0
+    if tokenizer == GEMINI_ESTIMATE:
+        return estimate_gemini_tokens(text)
+    return len(get_encoder(tokenizer).encode(text))
+
+def count_tokens_batch(texts, num_threads=DEFAULT_TOKENIZE_THREADS, tokenizer=DEFAULT_TOKENIZER):
+    if tokenizer == GEMINI_ESTIMATE:
+        return [estimate_gemini_tokens(text) for text in texts]
+    # Slices bound how many token lists are alive at once
+    encoder = get_encoder(tokenizer)
+    counts = []
+    for start in range(0, len(texts), TOKENIZE_BATCH_SIZE):
+        batch = texts[start:start + TOKENIZE_BATCH_SIZE]
+        counts.extend(len(tokens) for tokens in encoder.encode_batch(batch, num_threads=num_threads))
+    return counts
+
+def _tokenize_executor():
+    # One long-lived pool, sized once and shared by every conversion in the process
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PARALLEL_POOL_THREADS,
+                                           thread_name_prefix="cl2gi-tokenize")
+        return _executor
+
+def count_tokens_parallel(texts, num_threads=DEFAULT_TOKENIZE_THREADS, tokenizer=DEFAULT_TOKENIZER):
+    """Count tokens of many texts on a shared thread pool, returning counts in input order.
+
+    tiktoken releases the GIL while encoding, so the threads use separate cores.
+    Texts are split into contiguous slices, a few per thread to even out long segments.
+    num_threads is capped at PARALLEL_POOL_THREADS, the size of the shared pool.
+    """
+    counter = partial(count_tokens, tokenizer=tokenizer)
+    num_threads = min(num_threads, PARALLEL_POOL_THREADS)
+    if num_threads <= 1 or len(texts) < 2:
+        return [counter(text) for text in texts]
+    size = -(-len(texts) // (num_threads * PARALLEL_SLICES_PER_THREAD))
+    slices = [texts[start:start + size] for start in range(0, len(texts), size)]
+    counts = []
+    for part in _tokenize_executor().map(lambda part: [counter(text) for text in part], slices):
+        counts.extend(part)
+    return counts
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    # surrogatepass: lone surrogates from a cut-off emoji escape still count as bytes
+    return max(1, round(len(text.encode("utf-8", "surrogatepass")) / APPROX_BYTES_PER_TOKEN))
+
+def estimate_gemini_tokens(text):
+    if not text:
+        return 0
+    return max(1, round(len(text) / GEMINI_CHARS_PER_TOKEN))
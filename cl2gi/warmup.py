@@ -0,0 +1,49 @@
+import argparse
+import hashlib
+import os
+import sys
+
+from cl2gi.tokenizer import (DEFAULT_TOKENIZER, TIKTOKEN_ENCODINGS, cached_ranks_path, encoder_load_seconds,
+                             get_encoder, install_ranks_file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m cl2gi.warmup",
+        description="Pre-load and verify tiktoken encodings in tiktoken's cache, "
+                    "so later runs load them without network access."
+    )
+    parser.add_argument("--cache-dir",
+                        help="tiktoken cache directory to fill (default: $TIKTOKEN_CACHE_DIR, "
+                             "$DATA_GYM_CACHE_DIR or the temp directory's data-gym-cache)")
+    parser.add_argument("--tokenizer", action="append", choices=list(TIKTOKEN_ENCODINGS),
+                        help=f"Encoding to pre-load; repeat for several (default: {DEFAULT_TOKENIZER}, "
+                             f"plus those of any --ranks-file)")
+    parser.add_argument("--ranks-file", action="append", default=[], metavar="PATH",
+                        help="Install this local .tiktoken ranks file instead of downloading it; repeat for several")
+    args = parser.parse_args(argv)
+
+    if args.cache_dir is not None:
+        os.environ["TIKTOKEN_CACHE_DIR"] = args.cache_dir
+    encoding_names = list(args.tokenizer or [])
+    try:
+        for ranks_file in args.ranks_file:
+            encoding_name = install_ranks_file(ranks_file)
+            if encoding_name not in encoding_names:
+                encoding_names.append(encoding_name)
+        for encoding_name in encoding_names or [DEFAULT_TOKENIZER]:
+            encoder = get_encoder(encoding_name)
+            ranks_path = cached_ranks_path(encoding_name)
+            with open(ranks_path, "rb") as f:
+                if hashlib.sha256(f.read()).hexdigest() != TIKTOKEN_ENCODINGS[encoding_name][1]:
+                    raise ValueError(f"{ranks_path} does not match the expected SHA-256")
+            if encoder.decode(encoder.encode("hello world")) != "hello world":
+                raise ValueError(f"{encoding_name} failed to round-trip a test string")
+            print(f"{encoding_name}: {ranks_path} verified, "
+                  f"loaded in {encoder_load_seconds(encoding_name) * 1000:.1f} ms")
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
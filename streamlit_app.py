@@ -1,8 +1,31 @@
 import streamlit as st
 import json
-from io import StringIO
+import hashlib
+import zipfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 import importlib.util
 
+from cl2gi import (
+    analyze_conversation,
+    convert_analyzed,
+    convert_export,
+    load_conversation,
+    output_filename,
+    write_gemini,
+)
+from cl2gi.converter import describe_error, export_output_path
+from cl2gi.diagnostics import StageTimer, timed, traced_run
+from cl2gi.jsonbackend import available_backends, get_json_backend
+from cl2gi.stream import sniff_top_level
+from cl2gi.tokencache import TokenCountCache
+from cl2gi.tokenizer import (DEFAULT_TOKENIZE_THREADS, DEFAULT_TOKENIZER, TIKTOKEN_ENCODINGS, TOKEN_MODES, TOKENIZERS,
+                             encoder_load_seconds, load_tokenizer)
+
 st.set_page_config(
     page_title="Claude to Gemini Format Converter",
     page_icon="🔄",
@@ -10,11 +33,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-tiktoken_available = importlib.util.find_spec("tiktoken") is not None
+@st.cache_resource
+def check_tiktoken_available():
+    return importlib.util.find_spec("tiktoken") is not None
 
-if tiktoken_available:
-    import tiktoken
-else:
+if not check_tiktoken_available():
     st.error("❌ Tiktoken is required for this app to function properly")
     st.info("Install with: pip install tiktoken")
     st.stop()
@@ -64,107 +87,381 @@ This tool converts Claude-style chat JSON files to Gemini's chunkedPrompt format
 Simply upload your Claude JSON file, click convert, and download the Gemini-compatible version.
 """)
 
-try:
-    enc = tiktoken.get_encoding("cl100k_base")
-except Exception as e:
-    st.error(f"Failed to initialize tiktoken encoder: {str(e)}")
-    st.stop()
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+class ResultCache:
+    """LRU cache keyed by upload content hash, bounded by an approximate byte budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, size, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self.current_bytes += size
+                while self.current_bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted_size
+                    self.evictions += 1
+        return value
+
+    def peek(self, key):
+        # Returns the cached value without touching the LRU order or the hit counters
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def evict(self, digest):
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == digest]:
+                self.current_bytes -= self._entries.pop(key)[1]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(CACHE_MAX_BYTES)
+
+result_cache = get_result_cache()
+
+@st.cache_resource
+def get_token_cache():
+    return TokenCountCache()
+
+token_cache = get_token_cache()
+
+def content_digest(raw_bytes):
+    return hashlib.blake2b(raw_bytes, digest_size=16).hexdigest()
+
+JOB_WORKERS = 2
+MAX_JOBS = 20
+JOB_POLL_SECONDS = 1.0
+
+class ConversionJob:
+    def __init__(self, job_id, file_name, result_key, total_messages, indent, kind="conversation"):
+        self.id = job_id
+        self.kind = kind
+        self.file_name = file_name
+        self.result_key = result_key
+        self.total_messages = total_messages
+        self.indent = indent
+        self.status = "queued"
+        self.messages_done = 0
+        self.tokens = 0
+        self.token_stats = None
+        # Export jobs count conversations, with progress from the read position of the export
+        self.fraction = 0.0
+        self.conversations_done = 0
+        self.current_entry = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
 
-def count_tokens(text):
-    if not text:
-        return 0
-    return len(enc.encode(text))
+    def update(self, event):
+        # Progress callback, called from the worker thread; plain attribute writes are enough for the poller
+        self.messages_done = event["messages_done"]
+        self.tokens = event["tokens"]
 
-def convert_claude_to_gemini(source_data):
-    if not isinstance(source_data, dict) or "chat_messages" not in source_data:
-        raise ValueError("Invalid input: Expected a JSON object with 'chat_messages' field")
+    def update_export(self, fraction, conversations_done, entry_name):
+        self.fraction = fraction
+        self.conversations_done = conversations_done
+        self.current_entry = entry_name
+
+    def tokens_per_second(self):
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.tokens / elapsed if elapsed > 0 else 0.0
+
+class JobQueue:
+    """Runs conversions on a small thread pool so a long conversion never blocks a script run.
+
+    Jobs outlive reruns; finished ones are kept until more than max_jobs exist.
+    Their results live in the result cache and disappear with it: the converted
+    document of a conversation, the ZIP archive of an account export.
+    """
+
+    def __init__(self, workers, max_jobs):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="convert-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_name, result_key, total_messages, compute, indent, kind="conversation"):
+        job = ConversionJob(uuid.uuid4().hex[:12], file_name, result_key, total_messages, indent, kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [job_id for job_id, old in self._jobs.items() if not old.active]
+            for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+                del self._jobs[job_id]
+        self._executor.submit(self._run, job, compute)
+        return job.id
+
+    def _run(self, job, compute):
+        job.status = "running"
+        job.started = time.monotonic()
+        try:
+            _, job.token_stats = compute(job)
+            job.messages_done = job.total_messages
+            job.tokens = job.token_stats["total_tokens"]
+            job.status = "done"
+        except Exception as e:
+            job.error = describe_error(e)
+            job.status = "failed"
+        finally:
+            job.finished = time.monotonic()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(JOB_WORKERS, MAX_JOBS)
+
+job_queue = get_job_queue()
+st.session_state.setdefault("job_ids", [])
+
+with st.sidebar:
+    st.header("Conversion Settings")
+    token_mode = st.selectbox(
+        "Token counting", TOKEN_MODES, index=0,
+        format_func=lambda mode: {"exact": "Exact", "approximate": "Approximate (fast)", "off": "Off"}[mode],
+        help="Exact uses tiktoken. Approximate estimates from UTF-8 size (within about ±12% for most "
+             "Markdown and mixed prose, up to 37% over for plain English, 35-65% under for digits, emoji "
+             "or CJK). Off omits tokenCount from the output."
+    )
+    tokenizer = st.selectbox(
+        "Tokenizer", TOKENIZERS, index=TOKENIZERS.index(DEFAULT_TOKENIZER), disabled=token_mode != "exact",
+        help="Tokenizer behind exact counts. gemini-estimate uses Gemini's documented ~4 characters "
+             "per token; tiktoken encodings are loaded the first time they are selected."
+    )
+    batch_tokenize = st.checkbox(
+        "Batch tokenization", value=False, disabled=token_mode != "exact",
+        help="Collect every segment first, then count tokens in batched multi-threaded calls. "
+             "Faster for conversations with thousands of segments; counts are identical."
+    )
+    parallel_tokenize = st.checkbox(
+        "Parallel tokenization", value=False, disabled=token_mode != "exact",
+        help="Count segments concurrently on a shared thread pool while keeping live progress. "
+             "Lets one large upload use several cores; counts are identical."
+    )
+    tokenize_threads = st.number_input(
+        "Tokenizer threads", min_value=1, max_value=64, value=DEFAULT_TOKENIZE_THREADS,
+        disabled=not (batch_tokenize or parallel_tokenize) or token_mode != "exact"
+    )
+    streaming_parse = st.checkbox(
+        "Streaming parse", value=False,
+        help="Decode the upload one message at a time instead of building the whole JSON tree. "
+             "Use for very large exports."
+    )
+    output_format = st.radio(
+        "Output format", ["Indented", "Compact"], horizontal=True,
+        help="Compact output drops indentation and is roughly a quarter smaller."
+    )
+    output_indent = 2 if output_format == "Indented" else None
+    json_backend = st.selectbox(
+        "JSON library", ["auto"] + available_backends(), index=0,
+        help="Library used to parse the upload and encode the output. Auto picks the first installed "
+             "of msgspec, orjson and json; the output is identical with each."
+    )
+    collect_diagnostics = st.checkbox(
+        "Collect diagnostics", value=False,
+        help="Record wall time, CPU time and memory peak of each pipeline stage; shown under Diagnostics below."
+    )
+    trace_memory = st.checkbox(
+        "Trace memory peaks", value=True, disabled=not collect_diagnostics,
+        help="Runs tracemalloc during each of your conversions, which slows every conversion in the "
+             "server down several times meanwhile. Peaks are process-wide, so they include other "
+             "sessions' conversions running at the same time."
+    )
+    st.markdown("---")
+
+if token_mode == "exact":
+    # Only the selected tokenizer is loaded, once per process
+    try:
+        load_tokenizer(tokenizer)
+    except Exception as e:
+        st.error(f"Failed to initialize the {tokenizer} tokenizer: {str(e)}")
+        st.stop()
+
+# The timer only holds tracemalloc inside a pipeline run, so a closed tab never leaves it running
+stage_timer = st.session_state.get("stage_timer")
+if not collect_diagnostics or (stage_timer is not None and stage_timer.trace_memory != trace_memory):
+    stage_timer = st.session_state["stage_timer"] = None
+if collect_diagnostics and stage_timer is None:
+    stage_timer = st.session_state["stage_timer"] = StageTimer(trace_memory=trace_memory)
+
+def render_export(file_name, raw_bytes, digest):
+    st.subheader("Claude Account Export")
+    st.write("This file is a list of conversations. Each conversation is converted to its own "
+             "Gemini file and the results are packed into a ZIP archive.")
     
-    converted = {
-        "runSettings": {
-            "temperature": 1.0,
-            "model": "models/gemini-2.5-pro-preview-03-25",
-            "topP": 0.95,
-            "topK": 64,
-            "maxOutputTokens": 65536,
-            "safetySettings": [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "OFF"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "OFF"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "OFF"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "OFF"}
-            ],
-            "responseMimeType": "text/plain",
-            "enableCodeExecution": False,
-            "enableEnhancedCivicAnswers": True,
-            "enableSearchAsATool": False,
-            "enableBrowseAsATool": False,
-            "enableAutoFunctionResponse": False
-        },
-        "systemInstruction": {},
-        "chunkedPrompt": {
-            "chunks": [],
-            "pendingInputs": [{
-                "text": "",
-                "role": "user"
-            }]
-        }
-    }
+    if st.button("Convert All Conversations", key="convert_export_button"):
+        # Like a single conversation, the export is converted on the job pool; the ZIP is the cached result
+        result_key = ("export", digest, token_mode, tokenizer, output_indent)
+        num_threads = int(tokenize_threads)
 
-    token_stats = {
-        "total_tokens": 0,
-        "user_tokens": 0,
-        "model_tokens": 0,
-        "thinking_tokens": 0,
-        "message_count": 0,
-        "has_thinking": False
-    }
+        def convert(job):
+            source = BytesIO(raw_bytes)
 
-    for msg in source_data.get("chat_messages", []):
-        role = "user" if msg["sender"] == "human" else "model"
-        token_stats["message_count"] += 1
-        
-        for segment in msg.get("content", []):
-            if segment["type"] == "thinking":
-                text = segment.get("thinking", "").strip()
-                if text:
-                    token_stats["has_thinking"] = True
-                    token_count = count_tokens(text)
-                    token_stats["total_tokens"] += token_count
-                    token_stats["thinking_tokens"] += token_count
-                    
-                    converted["chunkedPrompt"]["chunks"].append({
-                        "text": text,
-                        "role": role,
-                        "isThought": True,
-                        "tokenCount": token_count
-                    })
-
-            elif segment["type"] == "text":
-                text = segment.get("text", "").strip()
-                if text:
-                    token_count = count_tokens(text)
-                    token_stats["total_tokens"] += token_count
-                    
-                    if role == "user":
-                        token_stats["user_tokens"] += token_count
-                    else:
-                        token_stats["model_tokens"] += token_count
-                    
-                    chunk = {
-                        "text": text,
-                        "role": role,
-                        "tokenCount": token_count
-                    }
-                    if role == "model":
-                        chunk["finishReason"] = "STOP"
-                    converted["chunkedPrompt"]["chunks"].append(chunk)
+            def on_conversation(index, entry_name, error):
+                # The read position of the export gives progress without counting conversations up front
+                job.update_export(min(source.tell() / max(len(raw_bytes), 1), 1.0), index + 1, entry_name)
+
+            archive_bytes = BytesIO()
+            with zipfile.ZipFile(archive_bytes, "w", zipfile.ZIP_DEFLATED) as archive:
+                export_stats = convert_export(
+                    source, lambda name: archive.open(name, "w"), indent=output_indent,
+                    progress=on_conversation, batch_tokenize=batch_tokenize, num_threads=num_threads,
+                    token_mode=token_mode, token_cache=token_cache, json_backend=json_backend,
+                    parallel_tokenize=parallel_tokenize, tokenizer=tokenizer
+                )
+            export_stats.setdefault("token_mode", token_mode)
+            return archive_bytes.getvalue(), export_stats
+
+        job_id = job_queue.submit(
+            file_name, result_key, 0,
+            lambda job: result_cache.get_or_compute(result_key, len(raw_bytes), lambda: convert(job)),
+            output_indent, kind="export"
+        )
+        st.session_state.job_ids.append(job_id)
+
+def render_export_result(job, archive_bytes):
+    export_stats = job.token_stats
+    st.markdown('<div class="token-info">', unsafe_allow_html=True)
+    st.write("**Export Statistics:**")
+    st.write(f"- Conversations: {export_stats['conversation_count']:,}")
+    if export_stats["failed"]:
+        st.write(f"- Failed: {len(export_stats['failed']):,}")
+    st.write(f"- Messages: {export_stats['message_count']:,}")
+    if export_stats["token_mode"] != "off":
+        st.write(f"- Total tokens: {export_stats['total_tokens']:,}")
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    for entry_name, error in export_stats["failed"]:
+        st.warning(f"Skipped {entry_name}: {error}")
+    
+    st.markdown('<div class="download-button">', unsafe_allow_html=True)
+    st.download_button(
+        label="📥 Download Converted Conversations (ZIP)",
+        data=archive_bytes,
+        file_name=export_output_path(output_filename(job.file_name), zip_exports=True),
+        mime="application/zip",
+        key=f"download_button_{job.id}"
+    )
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    return converted, token_stats
+def render_job_result(job, converted_data):
+    token_stats = job.token_stats
+    job_token_mode = token_stats["token_mode"]
+    chunk_count = len(converted_data["chunkedPrompt"]["chunks"])
+    st.write(f"Number of chunks: {chunk_count} | {job.tokens_per_second():,.0f} tokens/s")
+    
+    st.markdown('<div class="token-info">', unsafe_allow_html=True)
+    if job_token_mode == "off":
+        st.write("**Token Statistics:** token counting is off")
+    else:
+        approx = "~" if job_token_mode == "approximate" else ""
+        st.write("**Token Statistics:**" + (" (approximate)" if approx else ""))
+        st.write(f"- Total tokens: {approx}{token_stats['total_tokens']:,}")
+        st.write(f"- User messages: {approx}{token_stats['user_tokens']:,} tokens")
+        st.write(f"- Model responses: {approx}{token_stats['model_tokens']:,} tokens")
+    
+        if token_stats["has_thinking"]:
+            st.write(f"- Thinking segments: {approx}{token_stats['thinking_tokens']:,} tokens")
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    if chunk_count > 0:
+        st.write("First chunk sample:")
+        st.code(json.dumps(converted_data["chunkedPrompt"]["chunks"][0], indent=2))
+    
+    st.markdown('<div class="success-message">✅ Conversion complete! Click the download button below.</div>', unsafe_allow_html=True)
+    
+    st.markdown('<div class="download-button">', unsafe_allow_html=True)
+    st.download_button(
+        label="📥 Download Converted File",
+        data=deferred_output(converted_data, job.indent, json_backend, stage_timer),
+        file_name=output_filename(job.file_name),
+        mime="application/json",
+        key=f"download_button_{job.id}"
+    )
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def deferred_output(converted_data, indent, backend, timer):
+    # Results are re-rendered on every rerun and progress tick, so the output is
+    # only serialized when its download button is clicked
+    def serialize():
+        output = BytesIO()
+        with traced_run(timer), timed(timer, "serialize"):
+            write_gemini(output, converted_data, indent=indent, json_backend=backend)
+        output.seek(0)
+        return output
+    return serialize
+
+def render_jobs(was_active):
+    st.subheader("Conversions")
+    jobs = [job for job in map(job_queue.get, st.session_state.job_ids) if job is not None]
+    for job in reversed(jobs):
+        if job.active and job.kind == "export":
+            entry = f", conversation {job.conversations_done:,}: {job.current_entry}" if job.current_entry else ""
+            st.progress(job.fraction, text=f"{job.file_name}: {job.status}{entry}")
+        elif job.active:
+            fraction = job.messages_done / job.total_messages if job.total_messages else 0.0
+            st.progress(min(fraction, 1.0),
+                        text=f"{job.file_name}: {job.status}, {job.messages_done:,} / {job.total_messages:,} messages"
+                             f" | {job.tokens_per_second():,.0f} tokens/s")
+        elif job.status == "failed":
+            st.error(f"{job.file_name}: Error: {job.error}")
+        else:
+            result = result_cache.peek(job.result_key)
+            with st.expander(f"✅ {job.file_name}", expanded=job is jobs[-1]):
+                if result is None:
+                    st.info("This result was evicted from the cache. Convert the file again to download it.")
+                elif job.kind == "export":
+                    render_export_result(job, result[0])
+                else:
+                    render_job_result(job, result[0])
+    
+    if was_active and not any(job.active for job in jobs):
+        st.rerun()
 
 col1, col2 = st.columns([2, 1])
 
 with col1:
     uploaded_file = st.file_uploader("Upload Claude JSON file", type=["json"], 
-                                    help="Select a Claude-format JSON file to convert")
+                                    help="Select a Claude-format JSON file, or a full account export (conversations.json), to convert")
 
     if uploaded_file is not None:
         file_details = {
@@ -176,82 +473,79 @@ with col1:
         st.json(file_details)
         
         try:
-            stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-            source_data = json.load(stringio)
-            
-            metadata = {}
-            for key in ["uuid", "name", "model", "created_at"]:
-                if key in source_data:
-                    metadata[key] = source_data[key]
-                    
-            if metadata:
-                st.subheader("Conversation Metadata")
-                st.json(metadata)
+            raw_bytes = uploaded_file.getvalue()
+            with timed(stage_timer, "hash"):
+                digest = content_digest(raw_bytes)
+            if sniff_top_level(BytesIO(raw_bytes)) == "[":
+                render_export(uploaded_file.name, raw_bytes, digest)
+            else:
+                def analyze():
+                    # A new analysis starts a new pipeline, so earlier timings would only mislead
+                    if stage_timer is not None:
+                        stage_timer.clear()
+                    with traced_run(stage_timer):
+                        if streaming_parse:
+                            # Messages are decoded lazily, so parsing is part of the "analyze" stage
+                            source_data = load_conversation(BytesIO(raw_bytes))
+                        else:
+                            with timed(stage_timer, "parse"):
+                                # Parsed straight from the upload's bytes, without decoded copies
+                                source_data = get_json_backend(json_backend).loads(raw_bytes)
+                        with timed(stage_timer, "analyze"):
+                            return analyze_conversation(source_data)
+
+                # One pass builds the preview summary and the chunks the conversion reuses
+                summary, chunks = result_cache.get_or_compute(("analysis", digest), len(raw_bytes), analyze)
             
-            if "chat_messages" not in source_data:
-                st.warning("The uploaded file doesn't appear to be a standard Claude format. It's missing the 'chat_messages' field.")
+                metadata = summary["metadata"]
+                if metadata:
+                    st.subheader("Conversation Metadata")
+                    st.json(metadata)
             
-            # Check if the file contains thinking segments
-            has_thinking = False
-            for msg in source_data.get("chat_messages", []):
-                for segment in msg.get("content", []):
-                    if segment.get("type") == "thinking":
-                        has_thinking = True
-                        break
-                if has_thinking:
-                    break
+                if not summary["has_chat_messages"]:
+                    st.warning("The uploaded file doesn't appear to be a standard Claude format. It's missing the 'chat_messages' field.")
             
-            format_info = "Has thinking segments: " + ("Yes" if has_thinking else "No")
+                format_info = "Has thinking segments: " + ("Yes" if summary["has_thinking"] else "No")
             
-            st.subheader("Source Data Preview")
-            message_count = len(source_data.get("chat_messages", []))
-            st.write(f"Number of messages: {message_count} | {format_info}")
+                st.subheader("Source Data Preview")
+                message_count = summary["message_count"]
+                st.write(f"Number of messages: {message_count} | {format_info}")
             
-            if message_count > 0:
-                first_msg = source_data["chat_messages"][0]
-                st.write("First message sample:")
-                st.code(json.dumps(first_msg, indent=2)[:500] + "..." if len(json.dumps(first_msg, indent=2)) > 500 else json.dumps(first_msg, indent=2))
+                if message_count > 0:
+                    with st.expander("Conversation summary"):
+                        st.write(f"Messages by sender: {summary['messages_by_sender']}")
+                        st.write(f"Segments by type: {summary['segments_by_type']}")
+                        st.write(f"Non-empty segments: {summary['chunk_count']:,} | "
+                                 f"Text: {summary['text_chars']:,} characters")
+                        st.write("Segment sizes (characters):")
+                        st.json(summary["segment_sizes"])
+                        st.write("Message sizes (characters):")
+                        st.json(summary["message_sizes"])
+
+                    st.write("First message sample:")
+                    st.code(summary["first_message_preview"])
             
-            if st.button("Convert to Gemini Format", key="convert_button"):
-                with st.spinner("Converting..."):
-                    converted_data, token_stats = convert_claude_to_gemini(source_data)
-                    
-                    st.subheader("Converted Data Preview")
-                    chunk_count = len(converted_data["chunkedPrompt"]["chunks"])
-                    st.write(f"Number of chunks: {chunk_count}")
-                    
-                    st.markdown('<div class="token-info">', unsafe_allow_html=True)
-                    st.write("**Token Statistics:**")
-                    st.write(f"- Total tokens: {token_stats['total_tokens']:,}")
-                    st.write(f"- User messages: {token_stats['user_tokens']:,} tokens")
-                    st.write(f"- Model responses: {token_stats['model_tokens']:,} tokens")
-                    
-                    if token_stats["has_thinking"]:
-                        st.write(f"- Thinking segments: {token_stats['thinking_tokens']:,} tokens")
-                    
-                    st.markdown('</div>', unsafe_allow_html=True)
-                    
-                    if chunk_count > 0:
-                        st.write("First chunk sample:")
-                        st.code(json.dumps(converted_data["chunkedPrompt"]["chunks"][0], indent=2))
-                    
-                    st.markdown('<div class="success-message">✅ Conversion complete! Click the download button below.</div>', unsafe_allow_html=True)
-                    
-                    converted_json = json.dumps(converted_data, indent=2)
-                    
-                    output_filename = uploaded_file.name.replace(".json", "_gemini.json")
-                    if not output_filename.endswith("_gemini.json"):
-                        output_filename += "_gemini.json"
-                    
-                    st.markdown('<div class="download-button">', unsafe_allow_html=True)
-                    st.download_button(
-                        label="📥 Download Converted File",
-                        data=converted_json,
-                        file_name=output_filename,
-                        mime="application/json",
-                        key="download_button"
+                if st.button("Convert to Gemini Format", key="convert_button"):
+                    # The conversion runs on the job pool; this script run only records the job id
+                    num_threads = int(tokenize_threads)
+
+                    def convert(job, timer=stage_timer):
+                        # Runs on the job pool; memory is traced for this conversion only
+                        with traced_run(timer):
+                            return convert_analyzed(summary, chunks, batch_tokenize=batch_tokenize,
+                                                    num_threads=num_threads, token_mode=token_mode,
+                                                    token_cache=token_cache, progress=job.update,
+                                                    diagnostics=timer, parallel_tokenize=parallel_tokenize,
+                                                    tokenizer=tokenizer, chunk_store=True)
+
+                    job_id = job_queue.submit(
+                        uploaded_file.name, ("convert", digest, token_mode, tokenizer), summary["message_count"],
+                        lambda job: result_cache.get_or_compute(
+                            ("convert", digest, token_mode, tokenizer), len(raw_bytes), lambda: convert(job)
+                        ),
+                        output_indent
                     )
-                    st.markdown('</div>', unsafe_allow_html=True)
+                    st.session_state.job_ids.append(job_id)
                     
         except json.JSONDecodeError:
             st.error("Error: The uploaded file is not a valid JSON file. Please check the file and try again.")
@@ -261,6 +555,12 @@ with col1:
             st.error(f"An unexpected error occurred: {str(e)}")
             st.info("If this problem persists, please check that your JSON follows the Claude format.")
 
+    session_jobs = [job for job in map(job_queue.get, st.session_state.job_ids) if job is not None]
+    if session_jobs:
+        any_active = any(job.active for job in session_jobs)
+        # Poll only while a job is queued or running; a finished batch triggers one full rerun
+        st.fragment(render_jobs, run_every=JOB_POLL_SECONDS if any_active else None)(any_active)
+
 with st.sidebar:
     st.header("Instructions")
     st.markdown("""
@@ -289,6 +589,10 @@ with st.sidebar:
     }
     ```
     
+    A full Claude account export (`conversations.json`, a list of such
+    conversations) is also accepted; each conversation is converted to its
+    own file and the results are downloaded as a ZIP archive.
+    
     ### Gemini Output Format:
     The converted file will follow Gemini's chunkedPrompt format:
     ```json
@@ -306,6 +610,39 @@ with st.sidebar:
     ```
     """)
 
+    st.markdown("---")
+    st.header("Cache")
+    st.write(f"Hits: {result_cache.hits:,} | Misses: {result_cache.misses:,} | Evictions: {result_cache.evictions:,}")
+    st.write(f"Entries: {len(result_cache)} | Size: {result_cache.current_bytes / (1024 * 1024):.1f} / {result_cache.max_bytes / (1024 * 1024):.0f} MB")
+    if uploaded_file is not None and st.button("Evict current file", key="evict_file_button"):
+        result_cache.evict(content_digest(uploaded_file.getvalue()))
+        st.rerun()
+    st.write(f"Token counts: {len(token_cache):,} cached | Hits: {token_cache.hits:,} | Misses: {token_cache.misses:,}")
+    if st.button("Clear cache", key="clear_cache_button"):
+        result_cache.clear()
+        token_cache.clear()
+        st.rerun()
+
+    with st.expander("Diagnostics"):
+        loaded = [f"{name} in {encoder_load_seconds(name) * 1000:.1f} ms" for name in TIKTOKEN_ENCODINGS
+                  if encoder_load_seconds(name) is not None]
+        st.write(f"Tokenizers loaded once per process: {', '.join(loaded) or 'none'}")
+        if stage_timer is None:
+            st.caption("Enable \"Collect diagnostics\" in the conversion settings to time each stage.")
+        elif not stage_timer.stages:
+            st.caption("No stages recorded yet.")
+        else:
+            st.table([
+                {
+                    "Stage": name,
+                    "Calls": record["calls"],
+                    "Wall ms": f"{record['wall_seconds'] * 1000:,.1f}",
+                    "CPU ms": f"{record['cpu_seconds'] * 1000:,.1f}",
+                    "Peak MB": "-" if record["peak_bytes"] is None else f"{record['peak_bytes'] / (1024 * 1024):,.1f}",
+                }
+                for name, record in stage_timer.report().items()
+            ])
+
     st.markdown("---")
     st.markdown("© 2025 - Claude to Gemini Converter")
     st.markdown("Created with ❤️ using Streamlit")
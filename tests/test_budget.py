@@ -0,0 +1,177 @@
+import json
+import random
+
+import pytest
+
+from cl2gi.budget import TokenPrefixSums, split_conversation, truncate_conversation
+from cl2gi.cli import main
+from cl2gi.converter import convert_claude_to_gemini
+
+def random_conversation(seed, message_count=30):
+    rng = random.Random(seed)
+    messages = []
+    for index in range(message_count):
+        sender = "human" if index % 2 == 0 else "assistant"
+        content = []
+        for _ in range(rng.randint(0, 3)):
+            kind = "thinking" if sender == "assistant" and rng.random() < 0.3 else "text"
+            content.append({"type": kind, kind: "word " * rng.choice([0, 1, 5, 20, 80])})
+        messages.append({"sender": sender, "content": content})
+    return {"chat_messages": messages}
+
+def converted_store(seed, **options):
+    converted, _ = convert_claude_to_gemini(random_conversation(seed, **options), token_mode="approximate",
+                                            chunk_store=True)
+    return converted
+
+def chunk_stats(chunks):
+    # Token statistics recomputed from chunk dicts
+    token_stats = dict.fromkeys(("total_tokens", "user_tokens", "model_tokens", "thinking_tokens"), 0)
+    for chunk in chunks:
+        token_stats["total_tokens"] += chunk["tokenCount"]
+        if chunk.get("isThought"):
+            token_stats["thinking_tokens"] += chunk["tokenCount"]
+        elif chunk["role"] == "user":
+            token_stats["user_tokens"] += chunk["tokenCount"]
+        else:
+            token_stats["model_tokens"] += chunk["tokenCount"]
+    token_stats["has_thinking"] = any(chunk.get("isThought") for chunk in chunks)
+    return token_stats
+
+def brute_force_split(totals, max_tokens, overlap_tokens):
+    last = len(totals) - 1
+    if last == 0:
+        return [(0, 0)]
+    parts = []
+    first = 0
+    while True:
+        end = first + 1
+        while end < last and totals[end + 1] - totals[first] <= max_tokens:
+            end += 1
+        parts.append((first, end))
+        if end == last:
+            return parts
+        if not overlap_tokens:
+            first = end
+            continue
+        first = next((start for start in range(first + 1, end)
+                      if totals[end] - totals[start] <= overlap_tokens
+                      and totals[end + 1] - totals[start] <= max_tokens), end)
+
+def brute_force_newest(prefix_sums, max_tokens, keep_first_user):
+    total = prefix_sums.total
+    end = len(total) - 1
+    if total[end] <= max_tokens:
+        return [(0, end)]
+    lowest = 0
+    head = None
+    roles = [chunk["role"] for chunk in prefix_sums.chunks.to_list()]
+    if keep_first_user and "user" in roles:
+        first_user = roles.index("user")
+        bounds = prefix_sums.message_bounds
+        message = max(index for index in range(len(bounds) - 1) if bounds[index] <= first_user)
+        head = (bounds[message], bounds[message + 1])
+        max_tokens = max(max_tokens - (total[head[1]] - total[head[0]]), 0)
+        lowest = head[1]
+    start = next(start for start in range(lowest, end + 1) if total[end] - total[start] <= max_tokens)
+    if head is None:
+        return [(start, end)]
+    if start == head[1]:
+        return [(head[0], end)]
+    return [head, (start, end)] if start < end else [head]
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("max_tokens, overlap_tokens", [(1, 0), (20, 0), (60, 0), (60, 30), (200, 0), (200, 150),
+                                                        (10 ** 6, 0)])
+def test_split_matches_brute_force(seed, max_tokens, overlap_tokens):
+    converted = converted_store(seed)
+    prefix_sums = TokenPrefixSums(converted["chunkedPrompt"]["chunks"])
+    parts = prefix_sums.split(max_tokens, overlap_tokens)
+    assert parts == brute_force_split(prefix_sums.message_totals, max_tokens, overlap_tokens)
+    assert parts[0][0] == 0 and parts[-1][1] == prefix_sums.message_count
+    totals = prefix_sums.message_totals
+    for (first, end), (next_first, next_end) in zip(parts, parts[1:]):
+        assert first < next_first <= end < next_end
+        assert totals[end] - totals[next_first] <= overlap_tokens
+    for first, end in parts:
+        assert end - first == 1 or totals[end] - totals[first] <= max_tokens
+
+@pytest.mark.parametrize("seed", range(5))
+def test_split_conversation_parts(seed):
+    converted = converted_store(seed)
+    chunks = converted["chunkedPrompt"]["chunks"].to_list()
+    parts = split_conversation(converted, 100, 40)
+    seen_messages = 0
+    for part, token_stats in parts:
+        part_chunks = part["chunkedPrompt"]["chunks"].to_list()
+        stats = chunk_stats(part_chunks)
+        assert {key: token_stats[key] for key in stats} == stats
+        assert token_stats["first_message"] + token_stats["overlap_messages"] == seen_messages
+        seen_messages = token_stats["first_message"] + token_stats["message_count"]
+        assert part["runSettings"] == converted["runSettings"]
+    assert seen_messages == 30
+    # Without overlap the parts are the conversation cut into pieces
+    parts = split_conversation(converted, 100)
+    assert [chunk for part, _ in parts for chunk in part["chunkedPrompt"]["chunks"].to_list()] == chunks
+
+def test_split_rejects_bad_budgets():
+    prefix_sums = TokenPrefixSums(converted_store(0)["chunkedPrompt"]["chunks"])
+    for max_tokens, overlap_tokens in [(0, 0), (-5, 0), (10, 10), (10, -1)]:
+        with pytest.raises(ValueError):
+            prefix_sums.split(max_tokens, overlap_tokens)
+
+def test_split_empty_conversation():
+    converted = converted_store(0, message_count=0)
+    parts = split_conversation(converted, 100)
+    assert len(parts) == 1 and parts[0][1]["total_tokens"] == 0
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("max_tokens", [1, 5, 30, 100, 400, 10 ** 6])
+@pytest.mark.parametrize("keep_first_user", [False, True])
+def test_newest_matches_brute_force(seed, max_tokens, keep_first_user):
+    prefix_sums = TokenPrefixSums(converted_store(seed)["chunkedPrompt"]["chunks"])
+    ranges = prefix_sums.newest(max_tokens, keep_first_user)
+    assert ranges == brute_force_newest(prefix_sums, max_tokens, keep_first_user)
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_tokens", [5, 60, 250])
+@pytest.mark.parametrize("keep_first_user", [False, True])
+def test_truncate_conversation(seed, max_tokens, keep_first_user):
+    converted = converted_store(seed)
+    chunks = converted["chunkedPrompt"]["chunks"]
+    truncated, token_stats = truncate_conversation(converted, max_tokens, keep_first_user)
+    kept = truncated["chunkedPrompt"]["chunks"]
+    stats = chunk_stats(kept.to_list())
+    assert {key: token_stats[key] for key in stats} == stats
+    assert token_stats["dropped_chunks"] == len(chunks) - len(kept)
+    assert token_stats["dropped_tokens"] + token_stats["total_tokens"] == sum(chunks.token_counts)
+    assert token_stats["message_count"] == len(kept.message_starts)
+    if not keep_first_user:
+        assert token_stats["total_tokens"] <= max_tokens
+        assert kept.to_list() == chunks.to_list()[len(chunks) - len(kept):]
+    # The public converter applies the same budget and returns plain chunk lists
+    source_data = random_conversation(seed)
+    budgeted, budgeted_stats = convert_claude_to_gemini(source_data, token_mode="approximate", max_tokens=max_tokens,
+                                                        keep_first_user=keep_first_user)
+    assert budgeted["chunkedPrompt"]["chunks"] == kept.to_list()
+    assert {key: budgeted_stats[key] for key in token_stats} == token_stats
+
+def test_budgets_need_a_counted_chunk_store():
+    converted, _ = convert_claude_to_gemini(random_conversation(0), token_mode="approximate")
+    with pytest.raises(TypeError):
+        TokenPrefixSums(converted["chunkedPrompt"]["chunks"])
+    converted, _ = convert_claude_to_gemini(random_conversation(0), token_mode="off", chunk_store=True)
+    with pytest.raises(ValueError):
+        TokenPrefixSums(converted["chunkedPrompt"]["chunks"])
+    with pytest.raises(ValueError):
+        convert_claude_to_gemini(random_conversation(0), token_mode="off", max_tokens=10)
+
+def test_cli_reports_the_written_parts(tmp_path, capsys):
+    input_path = tmp_path / "conv.json"
+    input_path.write_text(json.dumps(random_conversation(0)), encoding="utf-8")
+    assert main([str(input_path), "--split-tokens", "100", "--token-mode", "approximate", "--no-progress"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith(f"{input_path} -> {tmp_path / 'conv_gemini.partNNN.json'} (")
+    written = sorted(path.name for path in tmp_path.glob("conv_gemini*"))
+    assert written == [f"conv_gemini.part{number:03d}.json" for number in range(1, len(written) + 1)]
+    assert [line.split()[0] for line in lines[1:]] == [str(tmp_path / name) for name in written]
@@ -0,0 +1,85 @@
+import threading
+import tracemalloc
+
+import pytest
+
+from cl2gi.diagnostics import StageTimer, traced_run
+
+@pytest.fixture(autouse=True)
+def no_tracing():
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc was started outside the tests")
+    yield
+    assert not tracemalloc.is_tracing()
+
+def test_tracing_runs_only_inside_runs():
+    timer = StageTimer()
+    assert not tracemalloc.is_tracing()
+    with timer.run():
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
+
+def test_tracing_runs_until_the_last_run_ends():
+    first, second = StageTimer(), StageTimer()
+    with first.run():
+        with second.run():
+            pass
+        assert tracemalloc.is_tracing()
+        with first.run():
+            pass
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
+
+def test_run_releases_tracing_on_error():
+    with pytest.raises(ValueError):
+        with StageTimer().run():
+            raise ValueError("failed conversion")
+
+def test_overlapping_runs_in_threads():
+    started, finish = threading.Event(), threading.Event()
+
+    def job():
+        with StageTimer().run():
+            started.set()
+            finish.wait()
+
+    thread = threading.Thread(target=job)
+    thread.start()
+    started.wait()
+    with StageTimer().run():
+        pass
+    assert tracemalloc.is_tracing()
+    finish.set()
+    thread.join()
+
+def test_stage_records_peak_inside_a_run():
+    timer = StageTimer()
+    with timer.run(), timer.stage("build"):
+        data = [bytes(1000) for _ in range(1000)]
+    del data
+    record = timer.report()["build"]
+    assert record["calls"] == 1 and record["peak_bytes"] > 0
+
+def test_stage_outside_a_run_has_no_peak():
+    timer = StageTimer()
+    with timer.stage("build"):
+        pass
+    assert timer.report()["build"]["peak_bytes"] is None
+
+def test_stage_has_no_peak_when_tracing_stops_during_it():
+    timer = StageTimer()
+    run = timer.run()
+    run.__enter__()
+    with timer.stage("build"):
+        run.__exit__(None, None, None)
+    assert timer.report()["build"]["peak_bytes"] is None
+
+def test_timer_without_memory_tracing_leaves_tracemalloc_alone():
+    timer = StageTimer(trace_memory=False)
+    with traced_run(timer), timer.stage("build"):
+        assert not tracemalloc.is_tracing()
+    assert timer.report()["build"]["peak_bytes"] is None
+
+def test_traced_run_without_timer():
+    with traced_run(None):
+        assert not tracemalloc.is_tracing()
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from cl2gi.converter import convert_file
+from cl2gi.incremental import convert_file_incremental, manifest_path_for
+
+def conversation(texts, uuid="conv-1"):
+    messages = []
+    for index, text in enumerate(texts):
+        content = [{"type": "text", "text": text}]
+        if index % 2:
+            content.insert(0, {"type": "thinking", "thinking": f"thinking about {text}"})
+        messages.append({"sender": "assistant" if index % 2 else "human", "content": content})
+    return {"uuid": uuid, "name": "test", "chat_messages": messages}
+
+TEXTS = [f"message {index} " + "word " * index for index in range(8)]
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "conv.json", str(tmp_path / "conv_gemini.json"), str(tmp_path / "full_gemini.json")
+
+def convert(paths, source_data, **options):
+    input_path, output_path, full_path = paths
+    input_path.write_text(json.dumps(source_data), encoding="utf-8")
+    token_stats = convert_file_incremental(str(input_path), output_path, **options)
+    expected_stats = convert_file(str(input_path), full_path, **options)
+    with open(output_path, "rb") as f, open(full_path, "rb") as expected:
+        assert f.read() == expected.read()
+    for key in ("total_tokens", "user_tokens", "model_tokens", "thinking_tokens", "message_count", "has_thinking"):
+        assert token_stats[key] == expected_stats[key]
+    return token_stats
+
+@pytest.mark.parametrize("options", [{}, {"indent": None}, {"token_mode": "approximate"}, {"token_mode": "off"},
+                                     {"streaming": True}])
+def test_append(paths, options):
+    assert convert(paths, conversation(TEXTS[:5]), **options)["reused_messages"] == 0
+    assert convert(paths, conversation(TEXTS), **options)["reused_messages"] == 5
+    assert convert(paths, conversation(TEXTS), **options)["reused_messages"] == 8
+
+def test_edit_rewrites_from_the_changed_message(paths):
+    convert(paths, conversation(TEXTS))
+    edited = TEXTS[:3] + ["an edited message"] + TEXTS[4:]
+    assert convert(paths, conversation(edited))["reused_messages"] == 3
+
+def test_metadata_edit_keeps_messages(paths):
+    convert(paths, conversation(TEXTS))
+    source_data = conversation(TEXTS)
+    source_data["chat_messages"][2]["created_at"] = "2024-01-01T00:00:00Z"
+    assert convert(paths, source_data)["reused_messages"] == 8
+
+def test_shrink(paths):
+    convert(paths, conversation(TEXTS))
+    assert convert(paths, conversation(TEXTS[:3]))["reused_messages"] == 3
+    assert convert(paths, conversation([]))["reused_messages"] == 0
+    assert convert(paths, conversation(TEXTS[:2]))["reused_messages"] == 0
+
+def test_uuid_change_rewrites_everything(paths):
+    convert(paths, conversation(TEXTS))
+    assert convert(paths, conversation(TEXTS, uuid="conv-2"))["reused_messages"] == 0
+    assert convert(paths, conversation(TEXTS, uuid="conv-2"))["reused_messages"] == 8
+
+def test_settings_change_rewrites_everything(paths):
+    convert(paths, conversation(TEXTS))
+    assert convert(paths, conversation(TEXTS), indent=None)["reused_messages"] == 0
+    assert convert(paths, conversation(TEXTS), indent=None, token_mode="approximate")["reused_messages"] == 0
+
+def test_changed_output_or_missing_manifest_rewrites_everything(paths):
+    _, output_path, _ = paths
+    convert(paths, conversation(TEXTS))
+    with open(output_path, "ab") as f:
+        f.write(b" ")
+    assert convert(paths, conversation(TEXTS))["reused_messages"] == 0
+    (paths[0].parent / manifest_path_for("conv_gemini.json")).unlink()
+    assert convert(paths, conversation(TEXTS))["reused_messages"] == 0
+
+@pytest.mark.parametrize("token_mode", ["exact", "off"])
+def test_lone_surrogates(paths, token_mode):
+    # A cut-off emoji in an export decodes to a lone surrogate
+    texts = ["cut \ud83d emoji", "lone \udc00 low half"]
+    assert convert(paths, conversation(texts), token_mode=token_mode)["reused_messages"] == 0
+    assert convert(paths, conversation(texts + ["more"]), token_mode=token_mode)["reused_messages"] == 2
@@ -0,0 +1,69 @@
+import json
+from io import BytesIO
+
+import pytest
+
+from cl2gi.converter import convert_claude_to_gemini
+from cl2gi.jsonbackend import available_backends, get_json_backend
+from cl2gi.stream import write_gemini
+
+BACKENDS = available_backends()
+
+TEXTS = [
+    "plain ASCII with \"quotes\" and \\backslashes\\ and /slashes/",
+    "control characters \x00 \x01 \x08 \t \n \r \x0b \x0c \x1b \x1f end",
+    "DEL \x7f and C1 \x80 \x9f controls",
+    "non-ASCII: é ü ß ñ — « » € 中文 日本語 한국어",
+    "emoji 🙂 👍🏽 👨‍👩‍👧 and a flag 🇫🇷",
+    "line and paragraph separators \u2028 \u2029 and NBSP \u00a0",
+    "a lone surrogate \ud83d from a cut-off emoji, and a low one \udc00",
+    "\x7f",
+    "é",
+]
+
+def conversation():
+    messages = []
+    for index, text in enumerate(TEXTS):
+        content = [{"type": "text", "text": text}]
+        if index % 3 == 1:
+            content.insert(0, {"type": "thinking", "thinking": "thinking: " + text})
+        messages.append({"sender": "assistant" if index % 2 else "human", "content": content})
+    return {"chat_messages": messages}
+
+def dumps(value, indent):
+    if indent is None:
+        return json.dumps(value, separators=(",", ":"))
+    return json.dumps(value, indent=indent)
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("text", TEXTS)
+def test_dumps_string_matches_json(backend, text):
+    assert get_json_backend(backend).dumps_string(text) == json.dumps(text)
+
+@pytest.mark.parametrize("backend", ["auto"] + BACKENDS)
+@pytest.mark.parametrize("indent", [2, None])
+@pytest.mark.parametrize("token_mode", ["exact", "off"])
+def test_write_gemini_matches_json_dumps(backend, indent, token_mode):
+    converted, _ = convert_claude_to_gemini(conversation(), token_mode=token_mode, chunk_store=True)
+    expected, _ = convert_claude_to_gemini(conversation(), token_mode=token_mode)
+    out = BytesIO()
+    write_gemini(out, converted, indent, backend)
+    assert out.getvalue() == dumps(expected, indent).encode("utf-8", "surrogatepass")
+    if indent is None:
+        assert b"\n" not in out.getvalue()
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_loads_matches_json(backend):
+    data = json.dumps(conversation()).encode("utf-8")
+    assert get_json_backend(backend).loads(data) == json.loads(data)
+    # Fast parsers reject lone surrogates and a byte order mark; json parses them
+    assert get_json_backend(backend).loads(b'{"text": "cut \\ud83d"}') == {"text": "cut \ud83d"}
+    assert get_json_backend(backend).loads(b"\xef\xbb\xbf" + data) == json.loads(data)
+
+def test_unknown_and_missing_backends():
+    with pytest.raises(ValueError):
+        get_json_backend("simdjson")
+    for name in ("msgspec", "orjson"):
+        if name not in BACKENDS:
+            with pytest.raises(ValueError):
+                get_json_backend(name)
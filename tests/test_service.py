@@ -0,0 +1,185 @@
+import asyncio
+import json
+from io import BytesIO
+
+import pytest
+
+from cl2gi.converter import convert_claude_to_gemini
+from cl2gi.service import ConversionService, create_app
+from cl2gi.stream import write_gemini
+
+CONVERSATION = {"uuid": "abc", "chat_messages": [
+    {"sender": "human", "content": [{"type": "text", "text": "Hello   \x7f \x01 «there» 🙂"}]},
+    {"sender": "assistant", "content": [{"type": "thinking", "thinking": "Short thought."},
+                                        {"type": "text", "text": "Hi! " * 5000}]},
+]}
+BODY = json.dumps(CONVERSATION).encode("utf-8")
+
+@pytest.fixture
+def service():
+    service = ConversionService(max_concurrency=1, max_pending=0)
+    yield service
+    service.shutdown()
+
+async def post(app, body, query="", started=None, hold_response=None, disconnect=False):
+    # Drives one POST /convert through the ASGI app, returning (status, headers, body).
+    # started is set once the response starts; with hold_response, sending the response
+    # body waits for that event, and with disconnect it fails.
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/convert", "raw_path": b"/convert", "root_path": "",
+        "query_string": query.encode("ascii"), "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    pieces = [body[start:start + 4096] for start in range(0, len(body), 4096)] or [b""]
+    messages = [{"type": "http.request", "body": piece, "more_body": index < len(pieces) - 1}
+                for index, piece in enumerate(pieces)]
+    response = {"status": None, "headers": {}, "body": []}
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {key.decode(): value.decode() for key, value in message["headers"]}
+            if started is not None:
+                started.set()
+        elif message["type"] == "http.response.body":
+            if disconnect:
+                raise OSError("client went away")
+            if hold_response is not None:
+                await hold_response.wait()
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
+
+def run(coroutine):
+    # A slot that is never freed makes a waiting request hang, so waits are bounded
+    return asyncio.run(asyncio.wait_for(coroutine, 20))
+
+def expected_output(token_mode="exact", indent=2):
+    converted, token_stats = convert_claude_to_gemini(CONVERSATION, token_mode=token_mode, chunk_store=True)
+    out = BytesIO()
+    write_gemini(out, converted, indent)
+    return out.getvalue(), token_stats
+
+@pytest.mark.parametrize("query, token_mode, indent", [
+    ("", "exact", 2),
+    ("compact=1", "exact", None),
+    ("token_mode=approximate", "approximate", 2),
+    ("token_mode=off&compact=true", "off", None),
+    ("streaming=1&batch_tokenize=1", "exact", 2),
+    ("parallel_tokenize=1&tokenize_threads=1", "exact", 2),
+])
+def test_output_matches_write_gemini(service, query, token_mode, indent):
+    status, headers, body = run(post(create_app(service), BODY, query))
+    expected, token_stats = expected_output(token_mode, indent)
+    assert status == 200
+    assert body == expected
+    assert headers["x-cl2gi-message-count"] == "2"
+    assert headers["x-cl2gi-token-mode"] == token_mode
+    if token_mode == "off":
+        assert "x-cl2gi-total-tokens" not in headers
+    else:
+        assert headers["x-cl2gi-total-tokens"] == str(token_stats["total_tokens"])
+        assert headers["x-cl2gi-thinking-tokens"] == str(token_stats["thinking_tokens"])
+    assert (service.admitted, service.active, service.completed) == (0, 0, 1)
+
+@pytest.mark.parametrize("query", ["token_mode=fast", "tokenizer=nope", "tokenize_threads=two", "tokenize_threads=0",
+                                   "tokenize_threads=1000"])
+def test_bad_parameters_get_400(service, query):
+    status, _, body = run(post(create_app(service), BODY, query))
+    assert status == 400
+    assert "error" in json.loads(body)
+
+def test_invalid_json_gets_400(service):
+    status, _, body = run(post(create_app(service), b'{"chat_messages": ['))
+    assert status == 400
+    assert json.loads(body)["error"].startswith("Invalid JSON")
+    assert service.admitted == 0
+
+@pytest.mark.parametrize("source_data", [
+    {"messages": []},
+    {"chat_messages": [1]},
+    {"chat_messages": [{"content": []}]},
+    {"chat_messages": [{"sender": "human", "content": [{"type": "text", "text": 5}]}]},
+    [CONVERSATION],
+])
+def test_unconvertible_conversation_gets_422(service, source_data):
+    status, _, body = run(post(create_app(service), json.dumps(source_data).encode("utf-8")))
+    assert status == 422
+    assert "error" in json.loads(body)
+    assert (service.admitted, service.active) == (0, 0)
+
+def test_body_too_large_gets_413():
+    service = ConversionService(max_body_bytes=1000)
+    try:
+        status, _, _ = run(post(create_app(service), BODY))
+        assert status == 413
+        assert service.admitted == 0
+    finally:
+        service.shutdown()
+
+def test_slot_is_held_while_the_response_is_sent(service):
+    app = create_app(service)
+
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+        slow = asyncio.create_task(post(app, BODY, started=started, hold_response=release))
+        await started.wait()
+        # The first request has converted and is stuck sending its response
+        rejected = await post(app, BODY)
+        assert (service.admitted, service.active) == (1, 1)
+        release.set()
+        first = await slow
+        after = await post(app, BODY)
+        return rejected, first, after
+
+    rejected, first, after = run(scenario())
+    assert rejected[0] == 503 and rejected[1]["retry-after"] == "1"
+    assert first[0] == after[0] == 200
+    assert first[2] == after[2] == expected_output()[0]
+    assert (service.admitted, service.active, service.completed, service.rejected) == (0, 0, 2, 1)
+
+def test_pending_request_waits_for_the_slot():
+    service = ConversionService(max_concurrency=1, max_pending=1)
+    app = create_app(service)
+
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(post(app, BODY, started=started, hold_response=release))
+        await started.wait()
+        second = asyncio.create_task(post(app, BODY))
+        while service.admitted < 2:
+            await asyncio.sleep(0.01)
+        third = await post(app, BODY)
+        assert not second.done()
+        release.set()
+        return third, await first, await second
+
+    try:
+        third, first, second = run(scenario())
+    finally:
+        service.shutdown()
+    assert third[0] == 503
+    assert first[0] == second[0] == 200
+    assert (service.admitted, service.active, service.completed) == (0, 0, 2)
+
+def test_disconnect_releases_the_slot(service):
+    app = create_app(service)
+
+    async def scenario():
+        with pytest.raises(Exception):
+            await post(app, BODY, disconnect=True)
+        # The abandoned response body is closed on the event loop
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return await post(app, BODY)
+
+    status, _, _ = run(scenario())
+    assert status == 200
+    assert (service.admitted, service.active, service.completed) == (0, 0, 1)
@@ -0,0 +1,68 @@
+import json
+from io import BytesIO, StringIO
+
+import pytest
+
+from cl2gi.stream import iter_conversations, load_conversation, sniff_top_level
+
+CONVERSATION = json.dumps({
+    "uuid": "abc",
+    "score": 12.5,
+    "ratio": -3e+10,
+    "flags": [1, 2.25E-3, True, None, False],
+    "chat_messages": [
+        {"sender": "human", "content": [{"type": "text", "text": "héllo \"there\""}], "weight": 1.5},
+        {"sender": "assistant", "content": [{"type": "text", "text": "hi"}], "index": 100},
+    ],
+    "size": 12.5,
+    "count": 7,
+}).encode("utf-8")
+
+def load_all(data, read_size):
+    source_data = load_conversation(BytesIO(data), read_size=read_size)
+    source_data["chat_messages"] = list(source_data["chat_messages"])
+    return source_data
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 5, 7, 16, 1 << 16])
+def test_load_conversation_matches_json_at_any_read_size(read_size):
+    assert load_all(CONVERSATION, read_size) == json.loads(CONVERSATION)
+
+@pytest.mark.parametrize("read_size", range(1, 12))
+def test_number_split_across_reads(read_size):
+    data = b'{"chat_messages": [], "score": 12.5}'
+    assert load_all(data, read_size) == {"chat_messages": [], "score": 12.5}
+
+def test_byte_order_mark_and_text_input():
+    assert load_all(b"\xef\xbb\xbf" + CONVERSATION, 4) == json.loads(CONVERSATION)
+    source_data = load_conversation(StringIO(CONVERSATION.decode("utf-8")), read_size=3)
+    assert list(source_data["chat_messages"]) == json.loads(CONVERSATION)["chat_messages"]
+
+def test_metadata_after_messages_appears_once_they_are_read():
+    source_data = load_conversation(BytesIO(CONVERSATION), read_size=8)
+    assert "size" not in source_data
+    list(source_data["chat_messages"])
+    assert source_data["size"] == 12.5 and source_data["count"] == 7
+
+@pytest.mark.parametrize("data", [
+    b'{"chat_messages": [1, 2,]}',
+    b'{"chat_messages": [1] "x": 2}',
+    b'{"chat_messages": [1]} extra',
+    b'{"chat_messages": [1], "score": 12.}',
+])
+def test_malformed_input_raises(data):
+    with pytest.raises(json.JSONDecodeError):
+        load_all(data, 3)
+
+def test_duplicate_chat_messages_is_rejected():
+    with pytest.raises(ValueError):
+        load_all(b'{"chat_messages": [], "chat_messages": []}', 4)
+
+@pytest.mark.parametrize("read_size", [1, 4, 1 << 16])
+def test_iter_conversations(read_size):
+    export = json.dumps([json.loads(CONVERSATION), {"chat_messages": []}, 2.5]).encode("utf-8")
+    assert list(iter_conversations(BytesIO(export), read_size=read_size)) == json.loads(export)
+
+def test_sniff_top_level_rewinds():
+    fp = BytesIO(b"  \n [1]")
+    assert sniff_top_level(fp) == "["
+    assert fp.tell() == 0
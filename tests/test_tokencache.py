@@ -0,0 +1,50 @@
+import json
+
+from cl2gi.converter import convert_claude_to_gemini
+from cl2gi.tokencache import TokenCountCache, text_digest
+from cl2gi.tokenizer import count_tokens
+
+def test_counts_match_and_repeats_hit():
+    cache = TokenCountCache()
+    texts = ["hello world", "another text", "hello world", ""]
+    assert cache.count_many(texts) == [count_tokens(text) for text in texts]
+    assert [cache.count(text) for text in texts] == [count_tokens(text) for text in texts]
+    assert cache.misses == 3
+    assert cache.hits == 4
+
+def test_lru_keeps_max_entries():
+    cache = TokenCountCache(max_entries=2)
+    for text in ("one", "two", "three"):
+        cache.count(text)
+    assert len(cache) == 2
+    cache.count("one")
+    assert cache.misses == 4
+
+def test_sqlite_counts_persist(tmp_path):
+    path = str(tmp_path / "tokens.sqlite")
+    cache = TokenCountCache(path=path)
+    cache.count_many(["persisted text", "more text"])
+    cache.close()
+    cache = TokenCountCache(path=path)
+    assert cache.count_many(["persisted text", "more text"]) == [count_tokens("persisted text"),
+                                                                 count_tokens("more text")]
+    assert cache.hits == 2 and cache.misses == 0
+    cache.close()
+
+def test_tokenizers_are_namespaced():
+    cache = TokenCountCache()
+    cache.count("same text")
+    cache.count("same text", tokenizer="gemini-estimate")
+    assert cache.misses == 2
+
+def test_lone_surrogates():
+    # A cut-off emoji in an export decodes to a lone surrogate
+    source_data = json.loads('{"chat_messages": [{"sender": "human", "content": '
+                             '[{"type": "text", "text": "cut \\ud83d emoji"}]}]}')
+    text = source_data["chat_messages"][0]["content"][0]["text"]
+    assert text_digest(text) != text_digest("cut  emoji")
+    expected, expected_stats = convert_claude_to_gemini(source_data)
+    cache = TokenCountCache()
+    for options in ({}, {"batch_tokenize": True}, {"parallel_tokenize": True}):
+        assert convert_claude_to_gemini(source_data, token_cache=cache, **options) == (expected, expected_stats)
+    assert expected_stats["total_tokens"] > 0
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from cl2gi import tokenizer
+from cl2gi.converter import analyze_conversation, convert_analyzed, convert_claude_to_gemini
+from cl2gi.tokencache import TokenCountCache
+
+def message(sender, *segments):
+    return {"sender": sender, "content": [{"type": kind, kind: text} for kind, text in segments]}
+
+CONVERSATION = {"chat_messages": [
+    message("human", ("text", "Hello, can you explain tokenizers?"), ("text", "   ")),
+    message("assistant", ("thinking", "The user wants an explanation.\nKeep it short."),
+            ("text", "A tokenizer splits text into tokens — «unicode» 🙂 included.")),
+    message("human", ("text", "")),
+    message("assistant", ("thinking", ""), ("text", "def f(x):\n    return x * 2\n" * 20)),
+    message("human", ("text", "Thanks!"), ("thinking", "  ")),
+    message("assistant"),
+    message("assistant", ("thinking", "Same text twice."), ("text", "Thanks!")),
+]}
+
+PATHS = [
+    {"batch_tokenize": True},
+    {"batch_tokenize": True, "num_threads": 2},
+    {"parallel_tokenize": True},
+    {"parallel_tokenize": True, "num_threads": 2},
+    {"parallel_tokenize": True, "num_threads": 4},
+]
+
+@pytest.fixture(autouse=True)
+def parallel_pool(monkeypatch):
+    # The shared pool is sized by the CPU count; a 1-core runner would count every "parallel" case serially
+    monkeypatch.setattr(tokenizer, "PARALLEL_POOL_THREADS", 4)
+    monkeypatch.setattr(tokenizer, "_executor", None)
+    yield
+    if tokenizer._executor is not None:
+        tokenizer._executor.shutdown(wait=True)
+
+def token_counts(converted):
+    return [chunk["tokenCount"] for chunk in converted["chunkedPrompt"]["chunks"]]
+
+@pytest.mark.parametrize("token_mode", ["exact", "approximate"])
+@pytest.mark.parametrize("options", PATHS)
+def test_batch_and_parallel_paths_match_default(options, token_mode):
+    expected, expected_stats = convert_claude_to_gemini(CONVERSATION, token_mode=token_mode)
+    converted, token_stats = convert_claude_to_gemini(CONVERSATION, token_mode=token_mode, **options)
+    assert converted == expected
+    assert token_counts(converted) == token_counts(expected)
+    assert token_stats == expected_stats
+
+def test_default_path_stats():
+    converted, token_stats = convert_claude_to_gemini(CONVERSATION)
+    chunks = converted["chunkedPrompt"]["chunks"]
+    # Empty and whitespace-only segments produce no chunks
+    assert len(chunks) == 7
+    assert [chunk.get("isThought", False) for chunk in chunks] == [False, True, False, False, False, True, False]
+    assert token_stats["message_count"] == 7
+    assert token_stats["has_thinking"] is True
+    assert token_stats["total_tokens"] == sum(token_counts(converted))
+    assert token_stats["thinking_tokens"] == chunks[1]["tokenCount"] + chunks[5]["tokenCount"]
+    assert (token_stats["user_tokens"] + token_stats["model_tokens"] + token_stats["thinking_tokens"]
+            == token_stats["total_tokens"])
+
+@pytest.mark.parametrize("options", [{}] + PATHS)
+def test_token_cache_matches_uncached(options):
+    expected, expected_stats = convert_claude_to_gemini(CONVERSATION, **options)
+    cache = TokenCountCache()
+    for _ in range(2):
+        converted, token_stats = convert_claude_to_gemini(CONVERSATION, token_cache=cache, **options)
+        assert converted == expected
+        assert token_stats == expected_stats
+    assert cache.hits > 0
+
+@pytest.mark.parametrize("options", [{}] + PATHS)
+def test_convert_analyzed_matches(options):
+    expected, expected_stats = convert_claude_to_gemini(CONVERSATION)
+    summary, chunks = analyze_conversation(CONVERSATION)
+    converted, token_stats = convert_analyzed(summary, chunks, **options)
+    assert converted == expected
+    assert token_stats == expected_stats
+
+def test_thinking_only_and_empty_conversations():
+    thinking_only = {"chat_messages": [message("assistant", ("thinking", "Only thoughts here."))]}
+    empty = {"chat_messages": [message("human", ("text", " ")), message("assistant")]}
+    for source_data in (thinking_only, empty, {"chat_messages": []}):
+        expected, expected_stats = convert_claude_to_gemini(source_data)
+        for options in PATHS:
+            assert convert_claude_to_gemini(source_data, **options) == (expected, expected_stats)
+    _, token_stats = convert_claude_to_gemini(thinking_only)
+    assert token_stats["thinking_tokens"] == token_stats["total_tokens"] > 0
+    _, token_stats = convert_claude_to_gemini(empty)
+    assert token_stats["total_tokens"] == 0 and token_stats["has_thinking"] is False
+
+def test_lone_surrogates():
+    # json.loads turns the escape of a cut-off emoji into a lone surrogate
+    source_data = {"chat_messages": [message("human", ("text", "cut \ud83d emoji")),
+                                     message("assistant", ("thinking", "lone \udc00"), ("text", "ok"))]}
+    for token_mode in ("exact", "approximate"):
+        expected, expected_stats = convert_claude_to_gemini(source_data, token_mode=token_mode)
+        assert expected_stats["total_tokens"] > 0
+        for options in PATHS:
+            converted = convert_claude_to_gemini(source_data, token_mode=token_mode, **options)
+            assert converted == (expected, expected_stats)
+
+def test_parallel_path_uses_several_threads(monkeypatch):
+    senders = ("assistant", "human")
+    source_data = {"chat_messages": [message(senders[index % 2], ("text", f"segment {index} " * index))
+                                     for index in range(200)]}
+    expected, expected_stats = convert_claude_to_gemini(source_data)
+    threads = set()
+    count_tokens = tokenizer.count_tokens
+
+    def recording_count(text, tokenizer=tokenizer.DEFAULT_TOKENIZER):
+        threads.add(threading.current_thread().name)
+        time.sleep(0.0005)
+        return count_tokens(text, tokenizer)
+
+    monkeypatch.setattr(tokenizer, "count_tokens", recording_count)
+    converted, token_stats = convert_claude_to_gemini(source_data, parallel_tokenize=True, num_threads=4)
+    assert converted == expected
+    assert token_stats == expected_stats
+    assert len(threads) > 1
+    assert all(name.startswith("cl2gi-tokenize") for name in threads)
+
+def test_options_are_keyword_only():
+    summary, chunks = analyze_conversation(CONVERSATION)
+    with pytest.raises(TypeError):
+        convert_claude_to_gemini(CONVERSATION, True)
+    with pytest.raises(TypeError):
+        convert_analyzed(summary, chunks, True)
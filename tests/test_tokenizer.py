@@ -0,0 +1,57 @@
+import os
+import shutil
+
+import pytest
+
+from cl2gi import cli, tokenizer
+from cl2gi.tokenizer import RANKS_FILE_ENV, cached_ranks_path, get_encoder
+
+# The ranks file the tests run with, before any of them points tiktoken elsewhere
+CL100K_RANKS = cached_ranks_path("cl100k_base")
+
+@pytest.fixture
+def empty_cache(tmp_path, monkeypatch):
+    # Encoders are loaded again, from an empty tiktoken cache
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(tokenizer, "_encoders", {})
+    monkeypatch.setattr("tiktoken.registry.ENCODINGS", {})
+    return cache_dir
+
+@pytest.fixture
+def ranks_file(tmp_path):
+    path = tmp_path / "cl100k_base.tiktoken"
+    shutil.copy(CL100K_RANKS, path)
+    return path
+
+def test_ranks_file_is_installed_on_first_use(empty_cache, ranks_file, monkeypatch):
+    monkeypatch.setenv(RANKS_FILE_ENV, str(ranks_file))
+    assert get_encoder("cl100k_base").encode("hello world")
+    assert cached_ranks_path("cl100k_base").startswith(str(empty_cache))
+    assert (empty_cache / os.path.basename(CL100K_RANKS)).exists()
+
+@pytest.mark.parametrize("contents", [None, b"not a ranks file"])
+def test_bad_ranks_file_raises_runtime_error(empty_cache, tmp_path, monkeypatch, contents):
+    path = tmp_path / "ranks.tiktoken"
+    if contents is not None:
+        path.write_bytes(contents)
+    monkeypatch.setenv(RANKS_FILE_ENV, str(path))
+    with pytest.raises(RuntimeError, match=RANKS_FILE_ENV):
+        get_encoder("cl100k_base")
+
+def test_corrupt_cache_raises_runtime_error(empty_cache, monkeypatch):
+    empty_cache.mkdir()
+    with open(cached_ranks_path("cl100k_base"), "wb") as f:
+        f.write(b"corrupt")
+    monkeypatch.delenv(RANKS_FILE_ENV, raising=False)
+    # tiktoken discards the bad cache entry and downloads again, which fails offline too
+    monkeypatch.setattr("tiktoken.load.read_file", lambda blobpath: b"corrupt")
+    with pytest.raises(RuntimeError, match="warmup"):
+        get_encoder("cl100k_base")
+
+def test_cli_reports_bad_ranks_file(empty_cache, tmp_path, monkeypatch, capsys):
+    input_path = tmp_path / "conv.json"
+    input_path.write_text('{"chat_messages": []}', encoding="utf-8")
+    monkeypatch.setenv(RANKS_FILE_ENV, str(tmp_path / "missing.tiktoken"))
+    assert cli.main([str(input_path), "-o", str(tmp_path / "out")]) == 1
+    assert capsys.readouterr().err.startswith(f"error: {RANKS_FILE_ENV} names")